@@ -0,0 +1,3228 @@
+#
+# FILE: keepAChangelogLib.py
+#
+# ABSTRACT: Implementation of keepAChangelog.py.
+#
+# keepAChangelog.py is only a small launcher that imports this module, so
+# Python can use the cached bytecode instead of compiling the whole tool on
+# every run.
+#
+# AUTHOR: Ralf Schandl
+#
+
+"""
+Tool to work with "Keep a Changelog" compatible CHANGELOG.md.
+See https://keepachangelog.com
+
+Usage: keepAChangelog.py [OPTIONS] <COMMAND> [COMMAND_PARAMETER...]
+
+OPTIONS:
+    -f, --file FILE  Use given file as CHANGELOG.md instead as file from
+                     current directory. With "-" the change log is read from
+                     stdin. Then the SCM tags are not checked and no caches
+                     are used. "rewrite" and "release" need "--stdout".
+    -n, --no-scm     Don't call SCM to check version tags.
+    --git-cmd        Call the git command to access the repository instead
+                     of reading it directly.
+    --no-cache       Don't use the tag date cache. See "Notes" below.
+    --parse-cache    Cache the parsed CHANGELOG.md. See "Notes" below.
+    --cache-dir DIR  Like "--parse-cache", but store the cache files in the
+                     given directory.
+    --no-tag-index   Query the SCM separately for every version tag instead
+                     of reading all version tags at once. Slow, only useful
+                     to compare with the tag index.
+    -F, --fast       Don't load and validate the entire CHANGELOG.md if not
+                     needed by the command. "info" just scans the file for
+                     the header of the requested version, "info latest" and
+                     "versions --latest N" stop reading the file as soon as
+                     the versions are found.
+    -i, --ignore     Continue even when CHANGELOG.md is detected as invalid
+                     during loading. Some problem can't be ignored, e.g. a
+                     invalid formatted version.
+    -B, --no-file-backup
+                     Don't create a backup file when writing CHANGELOG.md
+    -P, --patch      "release" only replaces the changed version header and
+                     compare link lines instead of rewriting the reformatted
+                     file.
+    --fsync          Flush CHANGELOG.md to disk after writing it.
+    --stdout         "rewrite" and "release" write the result to stdout
+                     instead of the file. No backup is created. Info
+                     messages are printed to stderr.
+    -q, --quiet      Be quiet. Use "-q" to suppress info output, "-qq" to
+                     suppress info and warning and "-qqq" to also supress
+                     error messages.
+    -d, --debug      Enable debug output. Use multiple times to see more
+                     details.
+    -S, --socket SOCKET
+                     Unix socket of a server started with "serve". The
+                     commands info, notes, versions, validate and ready are
+                     sent to the server. If the server is not running or
+                     doesn't answer within 15 seconds, the command is
+                     executed locally. Default: Environment variable
+                     KEEPACHANGELOG_SOCKET.
+    --timings FORMAT Print the number of calls, the wall time and the peak
+                     memory usage of the phases load, validate, scm,
+                     release, render and write to stderr. FORMAT is "text"
+                     or "json".
+    --startup-profile
+                     Print the time needed for starting the interpreter,
+                     loading the module, handling the options and executing
+                     the command to stderr.
+
+COMMAND:
+    validate         Validates CHANGELOG.md. Only validates some basic
+                     rules, like:
+                     - valid version names
+                     - not more than one unreleased version
+                     Does NOT validate markdown!
+
+    print            Prints CHANGELOG.md to stdout. Reformatted!
+
+    ready            Checks if the change log is ready for release. Every
+                     version entry needs a release date, the links to Github
+                     compare must contain versions tags. Every version needs
+                     a corresponding SCM tag (except "-n" is given).
+
+    release VERSION  Updates CHANGELOG.md to release the given version. Will
+                     always print a warning that a SCM tag should be created.
+
+    info VERSION     Prints the change log entry for the given version. The
+                     header line is not printed, just the body. The VERSION
+                     "latest" is the newest released version.
+
+    versions [--latest N]
+                     Lists the versions and their release dates. Only the
+                     N newest versions with "--latest N".
+
+    stats [--format text|json]
+                     Prints release statistics: number of releases and
+                     prereleases, the percentiles of the days between
+                     releases, the releases per year, how many releases
+                     were major, minor, patch or prereleases (compared to
+                     the previous release) and for how many days the
+                     unreleased version is open (since the latest release).
+                     The SCM tags are not checked.
+
+    notes [--since DATE] [--until DATE] [FROM]..[TO]
+                     Prints the change log entries of all versions newer
+                     than FROM up to and including TO, e.g. the notes for
+                     upgrading from FROM to TO. Without FROM starts with the
+                     oldest version, without TO ends with the newest
+                     version (including "Unreleased"). TO can be "latest".
+                     With "--since" and "--until" only versions released in
+                     the given date range (YYYY-MM-DD, inclusive) are
+                     printed.
+
+    rewrite          Rewrites CHANGELOG.md reformatted.
+
+    dump [--format json|ndjson]
+                     Writes the parsed CHANGELOG.md as JSON (default) with
+                     the title, the versions (with version, date, note,
+                     body, compare link and line numbers), the other links
+                     and the file comment.
+                     With "ndjson" every title, version, link and comment is
+                     written as one JSON object per line as soon as it is
+                     read. The file is not validated, and version records
+                     contain no compare link, it is a separate link record.
+
+    diff REV1 [REV2] Reports the versions added, removed or modified between
+                     the CHANGELOG.md of the GIT revisions REV1 and REV2
+                     (default: the file in the working tree). Only the
+                     hashes of the parsed entries are compared, changes of
+                     the title and of links that are no compare links are
+                     also reported. Exit code 1 if there are differences.
+
+    search TERM...   Prints the lines of the version entries that contain
+                     all given terms, prefixed with the version. The search
+                     is case insensitive and matches entire words. A TERM
+                     with multiple words (e.g. "buffer overflow" or
+                     CVE-2020-1234) is searched as phrase in one line. A
+                     TERM ending with "*" matches all words starting with
+                     it. Exit code 1 if nothing is found. See "Notes" below.
+
+    clear-cache      Removes the tag date cache of the GIT repository.
+
+    batch [-j JOBS] validate|ready FILE_OR_DIR...
+                     Runs "validate" or "ready" for all given files and all
+                     CHANGELOG.md found in the given directories (hidden
+                     directories are skipped). Runs JOBS checks in parallel
+                     (default: number of CPUs). The SCM tags are only read
+                     once per repository. Fails if one of the checks fails.
+
+    watch [--interval SECONDS]
+                     Validates CHANGELOG.md again whenever it or the SCM
+                     tags change (checked every SECONDS, default 0.5) until
+                     interrupted with Ctrl-C. Only the changed sections of
+                     the file are parsed again and only the checks of the
+                     affected versions run again. The tag dates are read
+                     again only if the tags changed.
+
+    serve [SOCKET]   Runs a server on the given Unix socket (default: see
+                     option "-S"). The server executes the commands info,
+                     notes, versions, validate and ready for clients (see
+                     option "-S") and keeps the loaded changelogs and tags
+                     in memory. Changelogs are loaded again when their size
+                     or modification time changed, the tags when the tags of
+                     the repository changed. Stop it with Ctrl-C or SIGTERM.
+
+Notes:
+    reformatting:
+        Whenever the tools writes out the CHANGELOG.md (either to file or to
+        screen), some basic reformatting happens:
+            - blank lines might be added or removed
+            - Whitespaces within markdown h1 or h2 header and links might be
+              normalized.
+            - Links at the end of the document might be reordered.
+        There is NO reformating regarding line length, indent etc!
+
+    unreleased:
+        The tool accepts two types of formatting for unreleased change entries.
+        Either (as prefered by keepachangelog.com):
+            ## [Unreleased]
+        Or (as prefered by me :-)):
+            ## [0.2.0] - UNRELEASED
+
+    SCM:
+        Currently only GIT with GitHub is supported.
+
+    library:
+        The script can be imported as module "keepAChangelog" (e.g. via a
+        symlink "keepAChangelog.py"). Create a configuration with
+        make_config(), then use load_changelog() or ChangeLog and Version
+        directly or run commands with run_command(). run_command()
+        temporarily replaces the global configuration and sys.stdout/stderr,
+        so it must not be called from multiple threads.
+
+    tag date cache:
+        The dates of the version tags are cached in the file
+        "keepAChangelog.tagcache" in the GIT directory. The cache is
+        discarded when the tags of the repository changed.
+
+    parse cache:
+        With "--parse-cache" or "--cache-dir" the parsed CHANGELOG.md is
+        stored as JSON and loaded instead of parsing the file again. The
+        cache is used as long as the file has the same size and either the
+        same modification time or the same content hash. Warnings given
+        while parsing the file are not repeated when the cache is used.
+
+    search index:
+        "search" stores an index of the words in CHANGELOG.md. The index is
+        used as long as the content hash of the file is unchanged.
+
+    cache files:
+        The parse cache and the search index are stored in the directory
+        given with "--cache-dir", in the GIT directory or in the directory
+        "$XDG_CACHE_HOME/keepAChangelog" (default: ~/.cache/keepAChangelog),
+        in this order.
+
+"""
+
+from __future__ import print_function
+
+import time
+# Start time for "--startup-profile". Set by keepAChangelog.py to its own
+# start time, so the import of this module is included.
+PROFILE_START = time.time()
+PROFILE_START_CPU = time.process_time()
+
+import os
+import sys
+import errno
+import re
+import getopt
+import zlib
+import struct
+import binascii
+import mmap
+import locale
+import bisect
+import functools
+from io import StringIO, BytesIO, TextIOWrapper
+from contextlib import closing
+from collections import namedtuple
+from enum import Enum
+
+# Imported when needed to speed up the start: subprocess, datetime, hashlib,
+# json, multiprocessing
+
+# Name of the changelog file to read from stdin and the content read. See
+# read_stdin().
+STDIN_FILE = "-"
+STDIN_DATA = None
+
+# Name of this program. If changed also change doc string.
+PROGRAM = "keepAChangelog.py"
+
+# Version of this tool. Sure we use SemVer ;-)
+VERSION = "0.1.0"
+
+# Detected SCM per directory. See get_scm().
+SCM_DETECTED = {}
+
+# State of the tag refs per directory when the tag index was read by the
+# server. See refresh_served_tags().
+SERVED_REFS_STATE = {}
+
+# Parse cache: Extension of the files and version of the format. Increment
+# the version whenever the content of the cache changes.
+PARSE_CACHE_FILE_EXT = "kaclCache"
+PARSE_CACHE_FORMAT = 1
+
+# Search index: Extension of the files and version of the format. Increment
+# the version whenever the content of the index changes.
+SEARCH_INDEX_FILE_EXT = "kaclIndex"
+SEARCH_INDEX_FORMAT = 2
+
+# Parsed changelogs by file. See load_changelog().
+CHANGELOG_CACHE = {}
+
+# Dates of SCM version tags per working directory and GIT directory. See
+# get_scm_tag_index().
+SCM_TAG_INDEX = {}
+
+# Name of the tag date cache file in the GIT directory and the version of its
+# format. Increment the version whenever the format changes.
+TAG_CACHE_FILE = "keepAChangelog.tagcache"
+TAG_CACHE_FORMAT = 1
+
+#---------[ RegEx ]------------------------------------------------------------
+# Regualar expressions used to parse the CHANGELOG.md
+
+# Matches a SemVer compatible version
+#
+# Pattern to match a semver.org compatible version number.
+# E.g: 1.0.0, 0.1.0-rc.3, 1.0.0-rc.4+20180508144700
+#
+VERSION_PATTERN = r"""
+    ^
+    (?P<major>(?:0|[1-9][0-9]*))
+    (
+    \.
+    (?P<minor>(?:0|[1-9][0-9]*))
+    (
+    \.
+    (?P<patch>(?:0|[1-9][0-9]*))
+    )?
+    )?
+    (-(?P<prerelease>
+        (?:(?:0|[1-9][0-9]*)|(?:[0-9A-Za-z][-0-9A-Za-z]*))
+        (?:\.(?:(?:0|[1-9][0-9]*)|(?:[0-9A-Za-z][-0-9A-Za-z]*)))*
+    ))?
+    (\+(?P<meta>
+        [0-9A-Za-z-]+
+        (\.[0-9A-Za-z-]+)*
+    ))?
+    $
+    """
+
+# Pattern to match a H1 line start and entire line
+H1_PATTERN = r"^#[^#].*$"
+TITLE_PATTERN = r"^# *(?P<title>[^#].*)$"
+
+# Pattern to match a H2 line start and entire version header
+H2_PATTERN = r"^##[^#].*$"
+VERS_HDR_PATTERN = r"^##  *(\[)?(?P<version>[^\s\]]*)(\])?(  *-  *(?P<date>\d{4}-\d{2}-\d{2})? *(?P<note>[^ ].*[^ ])?)?$"
+
+# matches a date as used in version headers
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+# matches the start of a link and a entire link line
+LINK_START_PATTERN = r"^\[\w[^\s\]]*\]:.*$"
+LINK_PATTERN = r"^\[(?P<label>\w[^\s\]]*)\]:  *(?P<href>[^ ]*)$"
+
+# Matches a comment
+COMMENT_PATTERN = r"^\[//\]:.*$"
+
+# Matches a word for the search index
+WORD_PATTERN = r"\w+"
+
+# Matches a line that might be a H1 or H2 header or a link. Lines starting
+# with "###" or "[//]" are always text or comments.
+LINE_START_PATTERN = r"^(?:#{1,2}(?!#)|\[(?!//\]))[^\n]*"
+
+# Matches trailing whitespace of a line and empty lines to be reduced to one
+TRAILING_SPACE_PATTERN = r"[^\S\n]+$"
+EMPTY_LINES_PATTERN = r"\n\n\n+"
+
+# Line types as returned by line_type()
+LINE_H1 = "h1"
+LINE_H2 = "h2"
+LINE_LINK = "link"
+LINE_COMMENT = "comment"
+LINE_TEXT = "text"
+
+# Matches every line type except LINE_TEXT. The name of the matching group is
+# the line type.
+LINE_TYPE_PATTERN = r"(?P<%s>%s)|(?P<%s>%s)|(?P<%s>%s)|(?P<%s>%s)" % (
+    LINE_H1, H1_PATTERN, LINE_H2, H2_PATTERN,
+    LINE_LINK, LINK_START_PATTERN, LINE_COMMENT, COMMENT_PATTERN)
+
+class LazyRegex(object):
+    """
+    Regular expression that is compiled when it is used the first time.
+    Attributes of the compiled expression (e.g. "match") are cached in the
+    instance, so there is no overhead after the first use.
+    """
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+        self.regex = None
+
+    def __getattr__(self, name):
+        if self.regex is None:
+            self.regex = re.compile(self.pattern, self.flags)
+        value = getattr(self.regex, name)
+        setattr(self, name, value)
+        return value
+
+# Compiled RegExes for pattern
+VERSION_RE = LazyRegex(VERSION_PATTERN, re.VERBOSE)
+TITLE_RE = LazyRegex(TITLE_PATTERN)
+VERS_HDR_RE = LazyRegex(VERS_HDR_PATTERN)
+LINK_RE = LazyRegex(LINK_PATTERN)
+DATE_RE = LazyRegex(DATE_PATTERN)
+COMMENT_RE = LazyRegex(COMMENT_PATTERN)
+WORD_RE = LazyRegex(WORD_PATTERN)
+LINE_START_RE = LazyRegex(LINE_START_PATTERN, re.MULTILINE)
+TRAILING_SPACE_RE = LazyRegex(TRAILING_SPACE_PATTERN, re.MULTILINE)
+EMPTY_LINES_RE = LazyRegex(EMPTY_LINES_PATTERN)
+LINE_TYPE_RE = LazyRegex(LINE_TYPE_PATTERN)
+
+#---------[ Exceptions ]-------------------------------------------------------
+class KaclException(Exception):
+    """
+    Base exception. Exceptions of this type are catched in main() and the
+    message is printed.
+    """
+    pass
+
+class CmdException(KaclException):
+    """
+    Somthing failed during command execution. E.g. Missing parameter.
+    """
+    pass
+
+class ValidateException(KaclException):
+    """
+    Exception thrown whenever something is seriously wrong with the CHANGELOG.md.
+    Message should contain the file name and affected line.
+    """
+    def __init__(self, location, message):
+        super(ValidateException, self).__init__("%s %s" % (location.location(), message))
+
+# Thrown when parsing a version string fails
+class InvalidVersionException(KaclException):
+    """
+    Exception thrown if a invalid version was found.
+    """
+    def __init__(self, version_string):
+        super(InvalidVersionException, self).__init__("Invalid version: \"%s\"" % version_string)
+
+#---------[ Classes ]----------------------------------------------------------
+class Scm(Enum):
+    """ Enum for SCM systems. """
+    git = 1
+
+# Config.scm value: Detect SCM when it is needed. See get_scm().
+SCM_AUTO = "auto"
+
+class Timings(object):
+    """
+    Collects the number of calls, the wall time and the peak memory usage
+    (maximum resident set size) per phase for the option "--timings".
+    The wall time of a phase includes the nested phases. See timed().
+    """
+    def __init__(self):
+        self.enabled = False
+        self.start = time.time()
+        # [calls, seconds, peak RSS in KB] per phase
+        self.phases = {}
+        # phases currently running, nested calls of a phase are only counted
+        self.running = set()
+
+    def call(self, phase, func, args, kwargs):
+        """ Calls the function and records the call for the given phase. """
+        stats = self.phases.setdefault(phase, [0, 0.0, None])
+        stats[0] += 1
+        if phase in self.running:
+            return func(*args, **kwargs)
+        self.running.add(phase)
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats[1] += time.time() - start
+            stats[2] = Timings.peak_rss()
+            self.running.discard(phase)
+
+    @staticmethod
+    def peak_rss():
+        """ Returns the maximum resident set size of the process in KB or None. """
+        try:
+            import resource # pylint: disable=import-outside-toplevel
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KB everywhere else
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+    def report(self, report_format):
+        """ Returns the report as text or JSON. """
+        total = time.time() - self.start
+        if report_format == "json":
+            import json # pylint: disable=import-outside-toplevel
+            phases = dict((phase, {"calls": calls, "wall_ms": round(seconds * 1000, 3), "peak_rss_kb": peak})
+                          for phase, (calls, seconds, peak) in self.phases.items())
+            return json.dumps({"total_ms": round(total * 1000, 3), "peak_rss_kb": Timings.peak_rss(),
+                               "phases": phases})
+        lines = ["TIMINGS: %-10s %7s %12s %15s" % ("phase", "calls", "wall [ms]", "peak RSS [KB]")]
+        for phase, (calls, seconds, peak) in self.phases.items():
+            lines.append("TIMINGS: %-10s %7d %12.1f %15s" % (phase, calls, seconds * 1000, peak))
+        lines.append("TIMINGS: %-10s %7s %12.1f %15s" % ("total", "", total * 1000, Timings.peak_rss()))
+        return "\n".join(lines)
+
+TIMINGS = Timings()
+
+def timed(phase):
+    """
+    Decorator to record the calls of the function for the given phase, if
+    the option "--timings" is given.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TIMINGS.enabled:
+                return func(*args, **kwargs)
+            return TIMINGS.call(phase, func, args, kwargs)
+        return wrapper
+    return decorator
+
+class Version(object):
+    """
+    Represents version number in a CHANGELOG.md. This is either
+    a semver.org compatible version number or the String "Unreleased".
+    "Unreleased" is the highest possible version number.
+    Versions are ordered by the semver.org precedence (build metadata is
+    ignored). Equal versions have the same version string.
+    """
+    __slots__ = ("version", "major", "minor", "patch", "numeric", "prerelease", "meta", "sort_key")
+
+    # Parsed versions by version string. See __init__().
+    parsed = {}
+
+    def __init__(self, version_str):
+        fields = Version.parsed.get(version_str)
+        if fields is None:
+            fields = Version._parse(version_str)
+            Version.parsed[version_str] = fields
+        (self.version, self.major, self.minor, self.patch, self.numeric, self.prerelease, self.meta,
+         self.sort_key) = fields
+
+    @staticmethod
+    def _parse(version_str):
+        """
+        Returns the tuple (version, major, minor, patch, numeric, prerelease,
+        meta, sort_key) for the given version string.
+        """
+        if version_str.lower() == "unreleased":
+            # higher than every sort key of a version number
+            return ("Unreleased", -1, -1, -1, None, None, None, (1,))
+
+        match = VERSION_RE.match(version_str)
+        if match is None:
+            raise InvalidVersionException(version_str)
+        major_str, minor_str, patch_str, prerelease, meta = match.group("major", "minor", "patch",
+                                                                        "prerelease", "meta")
+        major = int(major_str)
+        minor = int(minor_str or 0)
+        patch = int(patch_str or 0)
+        if (major + minor + patch) == 0:
+            raise InvalidVersionException(version_str)
+        numeric = "%d" % major
+        if minor_str is not None:
+            numeric = "%s.%d" % (numeric, minor)
+            if patch_str is not None:
+                numeric = "%s.%d" % (numeric, patch)
+        # A version without prerelease is higher than one with prerelease.
+        # Numeric prerelease identifiers are lower than alphanumeric ones.
+        if prerelease is None:
+            sort_key = (0, major, minor, patch, 1)
+        else:
+            sort_key = (0, major, minor, patch, 0,
+                        tuple((0, int(part), "") if part.isdigit() else (1, 0, part)
+                              for part in prerelease.split(".")))
+        return (version_str, major, minor, patch, numeric, prerelease, meta, sort_key)
+
+    def __hash__(self):
+        return hash(self.version)
+
+    def __eq__(self, other):
+        if not isinstance(other, Version):
+            return False
+        return self.version == other.version
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __lt__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.sort_key < other.sort_key
+
+    def __le__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.sort_key <= other.sort_key
+
+    def __ge__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.sort_key >= other.sort_key
+
+    def __gt__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.sort_key > other.sort_key
+
+    def __str__(self):
+        return self.version
+
+class FileLocation(object):
+    """
+    Base Class for something that knows its location in a file (name & linenumber).
+    """
+    def __init__(self, filename, line_num):
+        self.filename = filename
+        self.line_num = line_num
+
+    def location(self):
+        """ Returns location string "filename[line-number]" """
+        return "%s[%d]" % (self.filename, self.line_num)
+
+    def __str__(self):
+        self.location()
+
+class Section(FileLocation):
+    """
+    Base class for a section with title and body.
+    Title is to be handled in derived classes.
+    """
+    def __init__(self, filename, line_num):
+        super(Section, self).__init__(filename, line_num)
+        # The body are the lines buffer[start:end]. The buffer is usually the
+        # decoded file shared by all sections. start is None if the body is
+        # empty.
+        self.buffer = ""
+        self.start = None
+        self.end = None
+        # cached result of body(), None if not yet created or outdated
+        self.body_cache = None
+
+    def set_body_span(self, buffer, start, end):
+        """
+        Sets the body of the section to the lines buffer[start:end]. The
+        body is cut from the buffer when needed, trailing whitespace is
+        removed and multiple empty lines are reduced to one.
+        """
+        self.buffer = buffer
+        self.start = start if end > start else None
+        self.end = end
+        self.body_cache = None
+
+    def set_body(self, body):
+        """ Sets the body of the section, e.g. from the parse cache. """
+        self.set_body_span(body, 0, len(body))
+
+    def body(self):
+        """ returns the body of the section. It is cut from the buffer on first use. """
+        if self.body_cache is None:
+            if self.start is None:
+                self.body_cache = ""
+            else:
+                body = TRAILING_SPACE_RE.sub("", self.buffer[self.start:self.end])
+                self.body_cache = EMPTY_LINES_RE.sub("\n\n", body).strip()
+        return self.body_cache
+
+    def title(self):
+        """ returns the markdown formatted title. Must be implemented by derived classes. """
+        raise NotImplementedError(self.__class__.__name__ + " needs to override method title")
+
+    def section(self, title):
+        """ Returns the entire section with title and body (if any). """
+        body = self.body()
+        if body:
+            return title + "\n\n" + body
+        else:
+            return title
+
+    def  __str__(self):
+        return self.section(self.title())
+
+#
+#
+class Title(Section):
+    """
+    Title section with title line and body
+    """
+    def __init__(self, filename, line_num, line):
+        super(Title, self).__init__(filename, line_num)
+        match = TITLE_RE.match(line)
+        if match is None:
+            raise ValidateException(self, "Invalid title: %s" % line)
+        else:
+            self.title_str = match.group("title")
+
+    def title(self):
+        return "# " + self.title_str
+
+    def as_dict(self):
+        """ Returns the title as dict for the command "dump". """
+        return {"type": "title", "line": self.line_num, "title": self.title_str, "body": self.body()}
+
+    @classmethod
+    def from_dict(cls, filename, record):
+        """ Creates a title from the dict created by as_dict(). """
+        title = cls(filename, record["line"], "# " + record["title"])
+        title.set_body(record["body"])
+        return title
+
+
+class VersionEntry(Section):
+    """
+    Version section with title line and body
+    """
+    def __init__(self, filename, line_num, line):
+        super(VersionEntry, self).__init__(filename, line_num)
+        match = VERS_HDR_RE.match(line)
+        if match is None:
+            raise ValidateException(self, "Invalid version header: %s" % line)
+        else:
+            try:
+                self.version = Version(match.group("version"))
+            except InvalidVersionException as exc:
+                raise ValidateException(self, "%s" % str(exc))
+
+            self.date = match.group("date")
+            self.note = match.group("note")
+        self.compare_link = None
+
+    def title(self):
+        txt = ""
+        if self.compare_link:
+            txt = "## [%s]" % self.version
+        else:
+            txt = "## %s" % self.version
+        if self.date or self.note:
+            txt = txt + " -"
+        if self.date != None:
+            txt = txt + " %s" % self.date
+        if self.note != None:
+            txt = txt + " %s" % self.note
+        return txt
+
+    def as_dict(self):
+        """ Returns the version entry as dict for the command "dump". """
+        link = None
+        if self.compare_link:
+            link = {"line": self.compare_link.line_num, "href": self.compare_link.href,
+                    "bounded": self.compare_link.bounded}
+        return {"type": "version", "line": self.line_num, "version": self.version.version, "date": self.date,
+                "note": self.note, "body": self.body(), "compare_link": link}
+
+    @classmethod
+    def from_dict(cls, filename, record):
+        """
+        Creates a version entry from the dict created by as_dict(). The compare
+        link is not set.
+        """
+        v_entry = cls.__new__(cls)
+        Section.__init__(v_entry, filename, record["line"])
+        v_entry.version = Version(record["version"])
+        v_entry.date = record["date"]
+        v_entry.note = record["note"]
+        v_entry.compare_link = None
+        v_entry.set_body(record["body"])
+        return v_entry
+
+
+class Link(FileLocation):
+    """
+    A link. "[label]: http://..."
+    """
+    def __init__(self, filename, line_num, line, config=None):
+        super(Link, self).__init__(filename, line_num)
+        match = LINK_RE.match(line)
+        if match is None:
+            raise ValidateException(self, "Invalid link: %s" % line)
+        else:
+            self.label = match.group("label")
+            self.href = match.group("href")
+            debug("Link Label: >>%s<<", self.label)
+            try:
+                self.version = Version(self.label)
+                v_str = self.version.version
+                self.bounded = self.href.endswith("...v%s" % v_str)
+            except InvalidVersionException:
+                if re.match(r"^\d\.", self.label) and not (config or CONFIG).ignore_invalid:
+                    warning("%s Link label looks like a version, but is not: %s" % (self.location(), self.label))
+                self.version = None
+
+    def __str__(self):
+        return "[%s]: %s" % (self.label, self.href)
+
+    def as_dict(self):
+        """ Returns the link as dict for the command "dump". """
+        return {"type": "link", "line": self.line_num, "label": self.label, "href": self.href,
+                "version": self.version.version if self.version else None,
+                "bounded": self.bounded if self.version else None}
+
+    @classmethod
+    def from_dict(cls, filename, record):
+        """ Creates a link from the dict created by as_dict(). """
+        link = cls.__new__(cls)
+        FileLocation.__init__(link, filename, record["line"])
+        link.label = record["label"]
+        link.href = record["href"]
+        link.version = None
+        if record["version"]:
+            link.version = Version(record["version"])
+            link.bounded = record["bounded"]
+        return link
+
+#
+#
+class Comment(FileLocation):
+    """
+    A comment: "[//]: ..."
+    """
+    def __init__(self, filename, line_num, line):
+        super(Comment, self).__init__(filename, line_num)
+        match = COMMENT_RE.match(line)
+        if match is None:
+            raise ValidateException(self, "Invalid comment: %s" % line)
+        else:
+            self.text = line
+
+    def __str__(self):
+        return self.text
+
+    def as_dict(self):
+        """ Returns the comment as dict for the command "dump". """
+        return {"type": "comment", "line": self.line_num, "text": self.text}
+
+    @classmethod
+    def from_dict(cls, filename, record):
+        """ Creates a comment from the dict created by as_dict(). """
+        return cls(filename, record["line"], record["text"])
+
+#
+#
+class ChangeLog(object):
+    """
+    The complete changelog file.
+    Uses the given Config or the global CONFIG.
+    """
+    # pylint: disable=too-many-instance-attributes
+    # Nine is reasonable in this case
+
+    # Kinds of validation findings
+    # Error reported by validate()
+    FINDING_INVALID = 1
+    # Missing SCM tag reported by validate() (might be allowed for one version)
+    FINDING_NO_TAG = 2
+    # Error only reported by is_releasable()
+    FINDING_NOT_READY = 3
+
+    def __init__(self, filename, with_body=True, config=None, incremental=False):
+        self.filename = filename
+        # directory of the file, e.g. for SCM access
+        self.file_dir = os.path.dirname(os.path.abspath(filename))
+        self.config = config or CONFIG
+        if filename == STDIN_FILE:
+            # no location on disk: no SCM and no parse cache
+            self.config = self.config._replace(scm=None, parse_cache=False)
+        # whether the bodies of the sections are loaded
+        self.with_body = with_body
+        # init members
+        self.version_dict = {}
+        self.version_list = []
+        self.entry_list = []
+        self.last_version = None
+        self.first_version = None
+        self.file_comment = None
+        # cached validation findings per version entry. See __get_findings()
+        self.findings = {}
+        # lines changed by release() by line number. See write()
+        self.patches = {}
+        # parsed sections by hash if loaded incremental. See reload()
+        self.sections = {} if incremental else None
+        # Load the file
+        self.__load()
+        # validate, but do not complain
+        self.silent = True
+        self.valid = self.validate()
+        self.silent = False
+
+    @timed("load")
+    def __load(self):
+        debug2("Loading %s", self.filename)
+        entries = None
+        if self.sections is not None:
+            entries = self.__parse_sections()
+        elif self.config.parse_cache:
+            entries = load_parse_cache(self.filename, self.with_body, self.config)
+            if entries is None:
+                stat = os.stat(self.filename)
+                entries = list(self.__parse())
+                save_parse_cache(self.filename, stat, self.with_body, entries, self.config)
+        else:
+            entries = self.__parse()
+        for entry in entries:
+            if isinstance(entry, VersionEntry):
+                self.__add_version_entry(entry)
+            elif isinstance(entry, Link) and entry.version:
+                self.__add_version_compare_link(entry)
+            elif isinstance(entry, Comment):
+                self.file_comment = entry
+            else:
+                self.entry_list.append(entry)
+        debug2("Finished loading %s", self.filename)
+
+    def __parse(self):
+        """
+        Parses the file. If the bodies are needed, the file is decoded into
+        one buffer shared by the sections (see parse_changelog_buffer()),
+        otherwise it is read line by line.
+        """
+        if self.with_body:
+            return parse_changelog_buffer(self.filename, read_changelog_text(self.filename), config=self.config)
+        return parse_changelog(self.filename, False, config=self.config)
+
+    def __parse_sections(self):
+        """
+        Parses the file for an incremental load. The file is split into
+        sections starting with a H1, H2 or link line. Only the sections whose
+        hash is not known from the previous load are parsed, the entries of
+        the other sections are reused with updated line numbers.
+        Yields the entries like parse_changelog().
+        """
+        import hashlib # pylint: disable=import-outside-toplevel
+        with open(self.filename, "r") as inputfile:
+            lines = inputfile.read().split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        starts = [num for num, line in enumerate(lines) if num == 0 or
+                  (line[:1] in ("#", "[") and line_type(line.rstrip()) in (LINE_H1, LINE_H2, LINE_LINK))]
+        previous = self.sections
+        self.sections = {}
+        parsed = 0
+        for num, start in enumerate(starts):
+            end = starts[num + 1] if num + 1 < len(starts) else len(lines)
+            # A comment at the end of a section only belongs to the section if
+            # a line follows. This is simulated by a dummy title.
+            sentinel = ["# -"] if end < len(lines) else []
+            text = "\n".join(lines[start:end] + sentinel)
+            digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+            candidates = previous.get(digest)
+            sec_entries = []
+            if candidates:
+                old_start, old_entries = candidates.pop()
+                for entry in old_entries:
+                    entry.line_num += start - old_start
+                    if isinstance(entry, VersionEntry):
+                        entry.compare_link = None
+                    sec_entries.append(entry)
+                    yield entry
+            else:
+                parsed += 1
+                for entry in parse_changelog(self.filename, self.with_body, lines[start:end] + sentinel,
+                                             self.config, start + 1):
+                    # skip the dummy title
+                    if entry.line_num <= end:
+                        sec_entries.append(entry)
+                        yield entry
+            # only completely parsed sections are reused
+            self.sections.setdefault(digest, []).append((start, sec_entries))
+        debug("Parsed %d of %d sections", parsed, len(starts))
+
+    def reload(self):
+        """
+        Loads the file again. If the ChangeLog was created with
+        incremental=True, only the changed sections are parsed and only the
+        checks of the version entries that changed (or whose neighbours
+        changed) run again on the next validation.
+        """
+        self.version_dict = {}
+        self.version_list = []
+        self.entry_list = []
+        self.last_version = None
+        self.first_version = None
+        self.file_comment = None
+        self.patches = {}
+        self.__load()
+        self.findings = {v_entry: cached for v_entry, cached in self.findings.items()
+                         if self.version_dict.get(v_entry.version) is v_entry}
+
+    #
+    # Add a version compare link to the appropriate version
+    #
+    def __add_version_compare_link(self, link):
+        if link.version in self.version_dict:
+            v_entry = self.version_dict[link.version]
+            if v_entry.compare_link is None:
+                v_entry.compare_link = link
+            else:
+                raise ValidateException(link, "Duplicate link: %s" %
+                        link.version)
+
+            if v_entry.date and not link.bounded:
+                raise ValidateException(link, "Unbounded link: %s" %
+                        link.href)
+
+        else:
+            raise ValidateException(link, "Link for unknown version: %s" %
+                    link.__str__())
+
+    def __add_version_entry(self, entry):
+        vers = entry.version
+        if vers in self.version_dict:
+            raise ValidateException(self.version_dict[vers], "Duplicate version  \"%s\". See also line %d" %
+                    (vers, entry.line_num))
+        if self.last_version is None:
+            self.last_version = vers
+        self.first_version = vers
+        self.entry_list.append(entry)
+        self.version_dict[vers] = entry
+        self.version_list.append(vers)
+
+    @timed("validate")
+    def validate(self, allow_missing_tag_for_version=None):
+        """
+        Validate the changelog
+
+        Optional: allow_missing_tag_for_version The given version does not need
+        a SCM tag
+        """
+        valid = True
+        if not self.version_list:
+            self.__file_error(0, "No version information found in file")
+            valid = False
+
+        for previous, key in zip([None] + self.version_list, self.version_list):
+            for kind, location, message in self.__get_findings(key, previous):
+                if kind == ChangeLog.FINDING_INVALID or (kind == ChangeLog.FINDING_NO_TAG and
+                                                         key.version != allow_missing_tag_for_version):
+                    self.__file_error(location.line_num, message)
+                    valid = False
+
+        return valid
+
+    def __get_findings(self, key, previous):
+        """
+        Returns the validation findings for the given version as list of
+        tuples (kind, location, message). previous is the version before the
+        given version in the file or None.
+        The findings are cached and only checked again if something changed
+        that is used by the checks.
+        """
+        v_entry = self.version_dict[key]
+        link = v_entry.compare_link
+        inputs = (key, v_entry.date, key == self.last_version, key == self.first_version,
+                  link, link.href if link else None, link.bounded if link else None, self.config.scm,
+                  previous)
+        cached = self.findings.get(v_entry)
+        if cached is None or cached[0] != inputs:
+            cached = (inputs, self.__check_entry(key, v_entry, previous))
+            self.findings[v_entry] = cached
+        return cached[1]
+
+    def __check_entry(self, key, v_entry, previous):
+        """ Runs all checks for the given version. See __get_findings(). """
+        findings = []
+        if previous is not None and not key < previous:
+            findings.append((ChangeLog.FINDING_INVALID, v_entry, "Version %s is not lower than previous version %s" %
+                    (key, previous)))
+        if v_entry.date is None and key != self.last_version:
+            findings.append((ChangeLog.FINDING_INVALID, v_entry, "Unexpected unreleased version: %s" % key))
+        if v_entry.compare_link is None and key != self.first_version:
+            findings.append((ChangeLog.FINDING_INVALID, v_entry, "Version without compare link: %s" % key))
+        if v_entry.date and get_scm(self.file_dir, self.config):
+            scm_date = get_scm_tag_date(key.version, self.file_dir, self.config)
+            if scm_date:
+                if v_entry.date != scm_date:
+                    findings.append((ChangeLog.FINDING_INVALID, v_entry,
+                            "Version %s release date and SCM tag date differ: \"%s\" <-> \"%s\"" %
+                            (key.version, v_entry.date, scm_date)))
+            else:
+                findings.append((ChangeLog.FINDING_NO_TAG, v_entry,
+                        "No SCM tag for version %s (searched for tag \"v%s\")" % (key.version, key.version)))
+
+        if v_entry.date is None:
+            findings.append((ChangeLog.FINDING_NOT_READY, v_entry, "Version without release date: %s" % key))
+        if re.search(r"SNAPSHOT", key.version, re.IGNORECASE):
+            findings.append((ChangeLog.FINDING_NOT_READY, v_entry, "Version containing \"SNAPSHOT\": %s" % key))
+        if v_entry.compare_link and not v_entry.compare_link.bounded:
+            findings.append((ChangeLog.FINDING_NOT_READY, v_entry.compare_link,
+                    "Unbounded compare link for version %s: %s" % (key, v_entry.compare_link.href)))
+        return findings
+
+    def latest_version(self):
+        """
+        Returns the newest released version or None.
+        """
+        for key in self.version_list:
+            if self.version_dict[key].date:
+                return key
+        return None
+
+    def version_body(self, version_str):
+        """
+        Return the version change info for the given version. The version
+        "latest" is the newest released version.
+        """
+        if version_str == "latest":
+            version = self.latest_version()
+        else:
+            version = Version(version_str)
+        if version in self.version_dict:
+            return self.version_dict[version].body()
+        else:
+            return None
+
+    def version_range(self, from_str, to_str):
+        """
+        Returns the version entries of all versions greater than from_str and
+        lower or equal to to_str, newest first. from_str and to_str can be
+        None for no limit. to_str can be "latest".
+        """
+        # the versions are sorted descending in a valid file
+        ordered = sorted(self.version_list)
+        keys = [vers.sort_key for vers in ordered]
+        start = 0
+        end = len(ordered)
+        if from_str:
+            start = bisect.bisect_right(keys, Version(from_str).sort_key)
+        if to_str == "latest":
+            to_version = self.latest_version()
+            end = bisect.bisect_right(keys, to_version.sort_key) if to_version else 0
+        elif to_str:
+            end = bisect.bisect_right(keys, Version(to_str).sort_key)
+        return [self.version_dict[vers] for vers in reversed(ordered[start:end])]
+
+    @timed("release")
+    def release(self, version_str):
+        """
+        Release a version. Version number is given as parameter.
+        """
+        version = Version(version_str)
+        unr = None
+        unreleased_found = False
+        if version in self.version_dict:
+            unr = self.version_dict[version]
+        if unr is None:
+            unreleased = Version("Unreleased")
+            if unreleased in self.version_dict:
+                unr = self.version_dict[unreleased]
+                unreleased_found = True
+        if unr is None:
+            raise CmdException("Neither entry \"%s\" nor \"Unreleased\" found" % version)
+
+        from datetime import datetime # pylint: disable=import-outside-toplevel
+        today = datetime.now().strftime("%Y-%m-%d")
+        info("Releasing %s -> %s(%s)" % (unr.version.version, version.version, today))
+        unr.version = version
+        unr.date = today
+        unr.note = None
+        new_link = re.sub(r"...[^.\s]+$", "...v%s" % version.version, unr.compare_link.href)
+        if new_link != unr.compare_link.href:
+            unr.compare_link.href = new_link
+            unr.compare_link.bounded = True
+        else:
+            raise CmdException("%s Failed to created bounded link for version %s from: %s" %
+                    (unr.compare_link.location(), version.version, unr.compare_link.href))
+
+        if unreleased_found:
+            # We moved version "Unreleased" to version "x.y.z": Need to update tables
+            self.version_list = [version if x == unreleased else x for x in self.version_list]
+            self.version_dict[version] = self.version_dict[unreleased]
+            del self.version_dict[unreleased]
+            if self.last_version == unreleased:
+                self.last_version = version
+            if self.first_version == unreleased:
+                self.first_version = version
+
+        self.patches[unr.line_num] = unr.title()
+        self.patches[unr.compare_link.line_num] = "[%s]: %s" % (version.version, unr.compare_link.href)
+
+
+    @timed("validate")
+    def is_releasable(self, allow_missing_tag_for_version=None):
+        """
+        Checks if the change log is releasable. No unreleased versions
+        and no compare links that don't end with a version are allowed.
+
+        Optional: allow_missing_tag_for_version The given version does not need
+        a SCM tag
+        """
+        valid = self.validate(allow_missing_tag_for_version)
+        check = True
+        for previous, key in zip([None] + self.version_list, self.version_list):
+            for kind, location, message in self.__get_findings(key, previous):
+                if kind == ChangeLog.FINDING_NOT_READY:
+                    self.__file_error(location.line_num, message)
+                    check = False
+
+        return valid and check
+
+    def render(self):
+        """
+        Yields the (reformatted) change log as pieces of text.
+        """
+        yield "\n"
+        for entry in self.entry_list:
+            yield str(entry)
+            yield "\n" if isinstance(entry, Link) else "\n\n\n"
+        yield "\n"
+
+        # the compare links
+        links_rendered = False
+        for key in self.version_list:
+            v_entry = self.version_dict[key]
+            if v_entry.compare_link:
+                yield "[%s]: %s\n" % (v_entry.version.version, v_entry.compare_link.href)
+                links_rendered = True
+        if links_rendered:
+            yield "\n"
+
+        if self.file_comment:
+            yield "%s\n" % self.file_comment
+
+    # Print the change log to the given stream
+    @timed("render")
+    def __do_print(self, stream):
+        stream.writelines(self.render())
+
+    def print(self):
+        """ Print the changelog to stdout. """
+        self.__do_print(sys.stdout)
+
+    @timed("write")
+    def write(self, patch=False):
+        """
+        Write the changelog back to the file it was read from.
+        Creates a backup file with extesion ".kaclBackup".
+        With patch=True only the lines changed by release() are replaced, the
+        rest of the file is copied unchanged.
+        The file is written to a temporary file, that replaces the file.
+        With the option "--stdout" the changelog is written to stdout
+        instead, without backup.
+        """
+        if self.config.stdout:
+            if patch:
+                output = BytesIO()
+                self.__do_patch(output)
+                sys.stdout.write(output.getvalue().decode(locale.getpreferredencoding(False)))
+            else:
+                self.__do_print(sys.stdout)
+            return
+        if self.filename == STDIN_FILE:
+            raise CmdException("Can't write the change log read from stdin -- use \"--stdout\"")
+        self.__create_backup()
+        if patch:
+            self.__replace_file(self.__do_patch, "wb")
+        else:
+            self.__replace_file(self.__do_print, "w")
+
+    # Copy the file to the given binary stream with the lines in self.patches
+    # replaced
+    @timed("render")
+    def __do_patch(self, stream):
+        if self.filename == STDIN_FILE:
+            self.__patch_data(read_stdin(), stream)
+            return
+        with open(self.filename, "rb") as inputfile, \
+                closing(mmap.mmap(inputfile.fileno(), 0, access=mmap.ACCESS_READ)) as data:
+            self.__patch_data(data, stream)
+
+    def __patch_data(self, data, stream):
+        encoding = locale.getpreferredencoding(False)
+        copied = 0
+        start = 0
+        line_num = 1
+        for patch_line in sorted(self.patches):
+            while line_num < patch_line:
+                # skip blocks of lines before the line
+                block_end = min(start + 65536, len(data))
+                newlines = data[start:block_end].count(b"\n")
+                if line_num + newlines < patch_line and block_end < len(data):
+                    line_num += newlines
+                    start = block_end
+                    continue
+                start = data.find(b"\n", start) + 1
+                if start == 0:
+                    raise CmdException("%s: Line %d not found" % (self.filename, patch_line))
+                line_num += 1
+            end = data.find(b"\n", start)
+            if end < 0:
+                end = len(data)
+            if end > start and data[end - 1:end] == b"\r":
+                end -= 1
+            debug2("Patching line %d: %s", patch_line, self.patches[patch_line])
+            stream.write(data[copied:start])
+            stream.write(self.patches[patch_line].encode(encoding))
+            copied = end
+        stream.write(data[copied:])
+
+    # Write the file via a temporary file that atomically replaces the file.
+    # If the file is a symlink, its target is replaced.
+    def __replace_file(self, write_func, mode):
+        target = os.path.realpath(self.filename)
+        tmp_file = "%s.%d.kaclTmp" % (target, os.getpid())
+        try:
+            with open(tmp_file, mode) as outputfile:
+                write_func(outputfile)
+                if self.config.fsync:
+                    outputfile.flush()
+                    os.fsync(outputfile.fileno())
+            os.chmod(tmp_file, os.stat(target).st_mode & 0o7777)
+            os.replace(tmp_file, target)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        if self.config.fsync:
+            dir_fd = os.open(os.path.dirname(target), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    # The backup is a hardlink (or copy) of the file, as the file is replaced
+    def __create_backup(self):
+        if self.config.filebackup:
+            backup_file = self.filename + ".kaclBackup"
+            try:
+                os.remove(backup_file)
+            except OSError as exc:
+                if exc.errno == errno.ENOENT:
+                    pass
+                else:
+                    raise
+
+            try:
+                os.link(os.path.realpath(self.filename), backup_file)
+            except OSError as exc:
+                debug("Can't create hardlink %s -- copying: %s", backup_file, exc)
+                import shutil # pylint: disable=import-outside-toplevel
+                shutil.copy2(self.filename, backup_file)
+
+    def __file_error(self, line_num, message):
+        if not self.silent:
+            loc = self.__file_loc(line_num)
+            print_stderr("%s ERROR: %s" % (loc.location(), message))
+
+    def __file_loc(self, line_num):
+        return FileLocation(self.filename, line_num)
+
+class GitRepo(object):
+    """
+    Read-only access to a GIT repository without calling the git command.
+    Only supports what is needed to get the dates of tags: loose and packed
+    refs, loose and packed objects (including deltas). Only SHA-1
+    repositories are supported.
+    """
+    # Object types in pack files
+    PACK_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+    PACK_OFS_DELTA = 6
+    PACK_REF_DELTA = 7
+
+    def __init__(self, git_dir):
+        self.git_dir = git_dir
+        # worktrees share refs and objects with the main repository
+        self.common_dir = git_dir
+        commondir_file = os.path.join(git_dir, "commondir")
+        if os.path.isfile(commondir_file):
+            with open(commondir_file) as cfile:
+                self.common_dir = os.path.normpath(os.path.join(git_dir, cfile.read().strip()))
+        self.object_dirs = [os.path.join(self.common_dir, "objects")]
+        alternates_file = os.path.join(self.common_dir, "objects", "info", "alternates")
+        if os.path.isfile(alternates_file):
+            with open(alternates_file) as afile:
+                for line in afile:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        self.object_dirs.append(os.path.join(self.object_dirs[0], line))
+        self.packs = None
+
+    @staticmethod
+    def find(start_dir):
+        """
+        Returns a GitRepo for the repository the given directory belongs to or
+        None if it is not within a GIT working tree.
+        """
+        cur_dir = os.path.abspath(start_dir)
+        while True:
+            dot_git = os.path.join(cur_dir, ".git")
+            if os.path.isdir(dot_git):
+                return GitRepo(dot_git)
+            if os.path.isfile(dot_git):
+                # worktree or submodule: ".git" file contains "gitdir: <path>"
+                with open(dot_git) as gfile:
+                    content = gfile.read().strip()
+                if content.startswith("gitdir:"):
+                    return GitRepo(os.path.normpath(os.path.join(cur_dir, content[7:].strip())))
+                return None
+            parent = os.path.dirname(cur_dir)
+            if parent == cur_dir:
+                return None
+            cur_dir = parent
+
+    def tags(self):
+        """
+        Returns a dict tag name -> (object id, peeled object id). The peeled
+        object id is only known for annotated tags from packed-refs, else it
+        is None.
+        """
+        tags = {}
+        packed_refs = os.path.join(self.common_dir, "packed-refs")
+        if os.path.isfile(packed_refs):
+            with open(packed_refs) as pfile:
+                last_tag = None
+                for line in pfile:
+                    line = line.rstrip()
+                    if not line or line.startswith("#"):
+                        continue
+                    if line.startswith("^"):
+                        if last_tag:
+                            tags[last_tag] = (tags[last_tag][0], line[1:])
+                        continue
+                    obj_id, ref = line.split(" ", 1)
+                    last_tag = None
+                    if ref.startswith("refs/tags/"):
+                        last_tag = ref[10:]
+                        tags[last_tag] = (obj_id, None)
+
+        # loose refs take precedence over packed refs
+        tag_dir = os.path.join(self.common_dir, "refs", "tags")
+        for dir_path, _, file_names in os.walk(tag_dir):
+            for file_name in file_names:
+                ref_file = os.path.join(dir_path, file_name)
+                with open(ref_file) as rfile:
+                    obj_id = rfile.read().strip()
+                if len(obj_id) != 40:
+                    raise KaclException("Unsupported ref: %s" % ref_file)
+                tags[os.path.relpath(ref_file, tag_dir).replace(os.sep, "/")] = (obj_id, None)
+        return tags
+
+    def refs_state(self):
+        """
+        Returns a string that changes whenever the tags of the repository
+        change. Based on size and modification time of packed-refs and the
+        loose tag refs.
+        """
+        state = []
+        ref_files = [os.path.join(self.common_dir, "packed-refs")]
+        for dir_path, dir_names, file_names in os.walk(os.path.join(self.common_dir, "refs", "tags")):
+            dir_names.sort()
+            ref_files.extend(os.path.join(dir_path, file_name) for file_name in sorted(file_names))
+        for ref_file in ref_files:
+            if os.path.isfile(ref_file):
+                stat = os.stat(ref_file)
+                state.append("%s %d %d" % (ref_file, stat.st_size, stat.st_mtime_ns))
+        import hashlib # pylint: disable=import-outside-toplevel
+        return hashlib.sha1("\n".join(state).encode("utf-8")).hexdigest()
+
+    def tag_dates(self, prefix):
+        """
+        Returns a dict tag name -> date (YYYY-MM-DD) for all tags starting
+        with the given prefix (not in a sub-hierarchy like "v/x"). The date is
+        the author date of the tagged commit.
+        """
+        dates = {}
+        for name, (obj_id, peeled_id) in self.tags().items():
+            if name.startswith(prefix) and "/" not in name:
+                date = self.commit_date(peeled_id or obj_id)
+                if date:
+                    dates[name] = date
+        return dates
+
+    def commit_date(self, obj_id):
+        """
+        Returns the author date (YYYY-MM-DD) of the given commit. Tags are
+        followed to the tagged object. Returns None if the object is not a
+        commit.
+        """
+        from datetime import datetime, timedelta # pylint: disable=import-outside-toplevel
+        obj_type, data = self.read_object(obj_id)
+        while obj_type == "tag":
+            # first line of a tag object: "object <id>"
+            obj_id = data.split(b"\n", 1)[0].split(b" ")[1].decode("ascii")
+            obj_type, data = self.read_object(obj_id)
+        if obj_type != "commit":
+            return None
+        for line in data.split(b"\n"):
+            if not line:
+                # end of commit header
+                break
+            if line.startswith(b"author "):
+                # "author Name <mail> 1577872800 +0100"
+                timestamp, tz_offset = line.rsplit(b" ", 2)[1:]
+                offset = int(tz_offset[1:3]) * 3600 + int(tz_offset[3:5]) * 60
+                if tz_offset.startswith(b"-"):
+                    offset = -offset
+                date = datetime(1970, 1, 1) + timedelta(seconds=int(timestamp) + offset)
+                return date.strftime("%Y-%m-%d")
+        return None
+
+    def read_object(self, obj_id):
+        """ Returns a tuple (type, data) for the object with the given id. """
+        for obj_dir in self.object_dirs:
+            obj_file = os.path.join(obj_dir, obj_id[:2], obj_id[2:])
+            if os.path.isfile(obj_file):
+                with open(obj_file, "rb") as ofile:
+                    raw = zlib.decompress(ofile.read())
+                header, _, data = raw.partition(b"\0")
+                return header.split(b" ")[0].decode("ascii"), data
+
+        bin_id = binascii.unhexlify(obj_id)
+        for pack_file, idx in self.__get_packs():
+            offset = GitRepo.__pack_offset(idx, bin_id)
+            if offset is not None:
+                with open(pack_file, "rb") as pfile:
+                    return self.__read_pack_entry(pfile, offset)
+
+        raise KaclException("GIT object not found: %s" % obj_id)
+
+    def __get_packs(self):
+        if self.packs is None:
+            self.packs = []
+            for obj_dir in self.object_dirs:
+                pack_dir = os.path.join(obj_dir, "pack")
+                if not os.path.isdir(pack_dir):
+                    continue
+                for file_name in sorted(os.listdir(pack_dir)):
+                    if file_name.endswith(".idx"):
+                        with open(os.path.join(pack_dir, file_name), "rb") as ifile:
+                            idx = ifile.read()
+                        if idx[:8] != b"\377tOc\0\0\0\2":
+                            raise KaclException("Unsupported pack index: %s" % file_name)
+                        self.packs.append((os.path.join(pack_dir, file_name[:-4] + ".pack"), idx))
+        return self.packs
+
+    @staticmethod
+    def __pack_offset(idx, bin_id):
+        # Pack index version 2: header, fan-out table, sorted object ids,
+        # CRCs, 4 byte offsets, 8 byte offsets
+        fanout = struct.unpack_from(">256I", idx, 8)
+        count = fanout[255]
+        first = bytearray(bin_id)[0]
+        low = fanout[first - 1] if first else 0
+        high = fanout[first]
+        ids_start = 8 + 1024
+        while low < high:
+            mid = (low + high) // 2
+            cur_id = idx[ids_start + mid * 20:ids_start + mid * 20 + 20]
+            if cur_id < bin_id:
+                low = mid + 1
+            elif cur_id > bin_id:
+                high = mid
+            else:
+                offsets_start = ids_start + count * 24
+                offset = struct.unpack_from(">I", idx, offsets_start + mid * 4)[0]
+                if offset & 0x80000000:
+                    offset = struct.unpack_from(">Q", idx,
+                            offsets_start + count * 4 + (offset & 0x7fffffff) * 8)[0]
+                return offset
+        return None
+
+    def __read_pack_entry(self, pfile, offset):
+        pfile.seek(offset)
+        byte = ord(pfile.read(1))
+        obj_type = (byte >> 4) & 7
+        # object size -- not needed
+        while byte & 0x80:
+            byte = ord(pfile.read(1))
+
+        if obj_type == GitRepo.PACK_OFS_DELTA:
+            byte = ord(pfile.read(1))
+            base_offset = byte & 0x7f
+            while byte & 0x80:
+                byte = ord(pfile.read(1))
+                base_offset = ((base_offset + 1) << 7) | (byte & 0x7f)
+            delta = GitRepo.__inflate(pfile)
+            base_type, base = self.__read_pack_entry(pfile, offset - base_offset)
+            return base_type, GitRepo.__apply_delta(base, delta)
+        elif obj_type == GitRepo.PACK_REF_DELTA:
+            base_id = binascii.hexlify(pfile.read(20)).decode("ascii")
+            delta = GitRepo.__inflate(pfile)
+            base_type, base = self.read_object(base_id)
+            return base_type, GitRepo.__apply_delta(base, delta)
+        elif obj_type in GitRepo.PACK_TYPES:
+            return GitRepo.PACK_TYPES[obj_type], GitRepo.__inflate(pfile)
+        else:
+            raise KaclException("Invalid object type %d in pack file %s" % (obj_type, pfile.name))
+
+    @staticmethod
+    def __inflate(pfile):
+        decomp = zlib.decompressobj()
+        data = []
+        while not decomp.eof:
+            chunk = pfile.read(4096)
+            if not chunk:
+                raise KaclException("Truncated pack file %s" % pfile.name)
+            data.append(decomp.decompress(chunk))
+        return b"".join(data)
+
+    @staticmethod
+    def __apply_delta(base, delta):
+        delta = bytearray(delta)
+        pos = 0
+        # skip source and target size
+        for _ in range(2):
+            while delta[pos] & 0x80:
+                pos += 1
+            pos += 1
+        result = []
+        while pos < len(delta):
+            opcode = delta[pos]
+            pos += 1
+            if opcode & 0x80:
+                # copy from base
+                cp_offset = 0
+                cp_size = 0
+                for i in range(4):
+                    if opcode & (1 << i):
+                        cp_offset |= delta[pos] << (8 * i)
+                        pos += 1
+                for i in range(3):
+                    if opcode & (0x10 << i):
+                        cp_size |= delta[pos] << (8 * i)
+                        pos += 1
+                if cp_size == 0:
+                    cp_size = 0x10000
+                result.append(base[cp_offset:cp_offset + cp_size])
+            elif opcode:
+                # insert data from delta
+                result.append(bytes(delta[pos:pos + opcode]))
+                pos += opcode
+            else:
+                raise KaclException("Invalid delta opcode 0")
+        return b"".join(result)
+
+#---------[ COMMANDS ]---------------------------------------------------------
+
+
+def cmd_validate(cmd, argv):
+    """ Validates CHANGELOG.md """
+    assert_no_args(cmd, argv)
+    if load_changelog(CONFIG.changelog, with_body=False).validate():
+        info("VALID")
+        return 0
+    else:
+        return 1
+
+def cmd_print(cmd, argv):
+    """ Prints CHANGELOG.md """
+    assert_no_args(cmd, argv)
+    load_validated(with_scm=False).print()
+    return 0
+
+def cmd_ready(cmd, argv):
+    """ Checks if CHANGELOG.md is ready for release. """
+    assert_no_args(cmd, argv)
+    if load_validated(with_body=False).is_releasable():
+        info("YES")
+        return 0
+    else:
+        info("NO")
+        return 1
+
+def cmd_release(cmd, argv):
+    """
+    Adds release date to unreleased version and fixes the compare link.
+    Requires the version as parameter
+    """
+    assert_arg_count(cmd, argv, 1)
+    version = argv.pop(0)
+    clg = load_validated(cached=False)
+    clg.release(version)
+    if clg.is_releasable(version):
+        clg.write(patch=CONFIG.patch)
+        info("DON'T FORGET to create a release tag %s" % version)
+        return 0
+    else:
+        error("Not written")
+        return 1
+
+def cmd_info(cmd, argv):
+    """
+    Prints the section body of the given version.
+    """
+    assert_arg_count(cmd, argv, 1)
+    version = argv.pop(0)
+    if CONFIG.fast and version == "latest":
+        txt = None
+        for entry in parse_changelog(CONFIG.changelog):
+            if isinstance(entry, VersionEntry) and entry.date:
+                txt = entry.body()
+                break
+    elif CONFIG.fast and CONFIG.changelog != STDIN_FILE:
+        txt = scan_version_body(CONFIG.changelog, version)
+    else:
+        txt = load_validated(with_scm=False).version_body(version)
+    if txt:
+        print(txt)
+        return 0
+    else:
+        error("No info for version %s available" % version)
+        return 1
+
+def cmd_notes(cmd, argv):
+    """
+    Prints the change log entries for a range of versions.
+    Requires the range "FROM..TO" as parameter.
+    """
+    since = None
+    until = None
+    try:
+        opt_tuple_list, argv = getopt.getopt(argv, "", ["since=", "until="])
+    except getopt.GetoptError as exc:
+        raise CmdException("%s: %s" % (cmd, exc))
+    for opt, value in opt_tuple_list:
+        if not DATE_RE.match(value):
+            raise CmdException("%s: Invalid date for %s: %s" % (cmd, opt, value))
+        if opt == "--since":
+            since = value
+        else:
+            until = value
+    assert_arg_count(cmd, argv, 1)
+    if ".." not in argv[0]:
+        raise CmdException("%s: Invalid range (expected FROM..TO): %s" % (cmd, argv[0]))
+    from_str, to_str = argv[0].split("..", 1)
+
+    v_entries = load_validated(with_scm=False).version_range(from_str, to_str)
+    if since or until:
+        v_entries = [e for e in v_entries
+                     if e.date and (since is None or e.date >= since) and (until is None or e.date <= until)]
+    if not v_entries:
+        error("No versions in range %s" % argv[0])
+        return 1
+    sys.stdout.writelines("%s\n\n" % entry for entry in v_entries)
+    return 0
+
+def cmd_dump(cmd, argv):
+    """
+    Writes the changelog as JSON or NDJSON.
+    """
+    import json # pylint: disable=import-outside-toplevel
+    dump_format = "json"
+    try:
+        opt_tuple_list, argv = getopt.getopt(argv, "", ["format="])
+    except getopt.GetoptError as exc:
+        raise CmdException("%s: %s" % (cmd, exc))
+    for _, value in opt_tuple_list:
+        dump_format = value
+    if dump_format not in ("json", "ndjson"):
+        raise CmdException("%s: Unknown format: %s" % (cmd, dump_format))
+    assert_no_args(cmd, argv)
+
+    if dump_format == "ndjson":
+        # written while parsing, the file is not validated
+        for entry in parse_changelog(CONFIG.changelog):
+            sys.stdout.write(json.dumps(entry.as_dict()) + "\n")
+        return 0
+
+    clg = load_validated(with_scm=False)
+    model = {
+        "file": CONFIG.changelog,
+        "title": None,
+        "versions": [clg.version_dict[vers].as_dict() for vers in clg.version_list],
+        "links": [],
+        "comment": clg.file_comment.as_dict() if clg.file_comment else None,
+    }
+    for entry in clg.entry_list:
+        if isinstance(entry, Title) and model["title"] is None:
+            model["title"] = entry.as_dict()
+        elif isinstance(entry, Link):
+            model["links"].append(entry.as_dict())
+    # json.dumps() is much faster than json.dump()
+    sys.stdout.write(json.dumps(model) + "\n")
+    return 0
+
+def cmd_diff(cmd, argv):
+    """
+    Reports the entries that differ between the changelog of two GIT
+    revisions. Requires one or two revisions as parameter. Without the
+    second revision the file in the working tree is used.
+    """
+    if len(argv) not in (1, 2):
+        raise CmdException("%s: Requires one or two revisions" % cmd)
+    assert_no_stdin(cmd)
+    filename = CONFIG.changelog
+    # "REV:./NAME" is resolved relative to the directory git runs in
+    objects = ["%s:./%s" % (rev, os.path.basename(filename)) for rev in argv]
+    blobs = git_cat_files(objects, os.path.dirname(os.path.abspath(filename)))
+    encoding = locale.getpreferredencoding(False)
+    digests = []
+    for obj, blob in zip(objects, blobs):
+        if blob is None:
+            raise CmdException("%s: Not found in GIT: %s" % (cmd, obj))
+        digests.append(entry_digests(obj, blob.decode(encoding).splitlines()))
+    if len(digests) == 1:
+        with open(filename, "r") as inputfile:
+            digests.append(entry_digests(filename, inputfile))
+
+    old, new = digests
+    changes = 0
+    for key, digest in new.items():
+        if key not in old:
+            print("added    %s" % key)
+        elif old[key] != digest:
+            print("modified %s" % key)
+        else:
+            continue
+        changes += 1
+    for key in old:
+        if key not in new:
+            print("removed  %s" % key)
+            changes += 1
+    return 1 if changes else 0
+
+def cmd_rewrite(cmd, argv):
+    """
+    Writes the CHANGELOG.md. This might result in reformatting.
+    """
+    assert_no_args(cmd, argv)
+    load_validated(with_scm=False).write()
+    return 0
+
+def cmd_search(cmd, argv):
+    """
+    Prints the lines of the versions containing all given search terms.
+    Requires at least one term as parameter.
+    """
+    if not argv:
+        raise CmdException("%s: Missing search term" % cmd)
+    index = load_search_index(CONFIG.changelog, CONFIG)
+    word_list = sorted(index["words"])
+    found = [search_lines(index, term, word_list) for term in argv]
+    versions = index["versions"]
+    starts = [first for _, first in versions]
+    # the versions that have a matching line for every term
+    matching = None
+    for lines in found:
+        hits = set(bisect.bisect_right(starts, line_idx) - 1 for line_idx in lines)
+        matching = hits if matching is None else matching & hits
+    if not matching:
+        return 1
+    for line_idx in sorted(set().union(*found)):
+        vers_idx = bisect.bisect_right(starts, line_idx) - 1
+        if vers_idx in matching:
+            print("%s: %s" % (versions[vers_idx][0], index["lines"][line_idx]))
+    return 0
+
+def cmd_clear_cache(cmd, argv):
+    """
+    Removes the tag date cache.
+    """
+    assert_no_args(cmd, argv)
+    repo = GitRepo.find(os.path.dirname(os.path.abspath(CONFIG.changelog)))
+    if repo is None:
+        raise CmdException("%s: Not in a GIT working tree" % CONFIG.changelog)
+    cache_file = os.path.join(repo.common_dir, TAG_CACHE_FILE)
+    try:
+        os.remove(cache_file)
+        info("Removed %s" % cache_file)
+    except OSError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+        info("No tag cache found")
+    return 0
+
+def cmd_versions(cmd, argv):
+    """
+    List the versions and release dates.
+    Optional "--latest N" only lists the N newest versions.
+    """
+    try:
+        opt_tuple_list, argv = getopt.getopt(argv, "", ["latest="])
+        count = None
+        for _, value in opt_tuple_list:
+            count = int(value)
+    except (getopt.GetoptError, ValueError) as exc:
+        raise CmdException("%s: %s" % (cmd, exc))
+    assert_no_args(cmd, argv)
+
+    if CONFIG.fast:
+        v_entries = (e for e in parse_changelog(CONFIG.changelog, False) if isinstance(e, VersionEntry))
+    else:
+        clg = load_validated(with_body=False, with_scm=False)
+        v_entries = (clg.version_dict[vers] for vers in clg.version_list)
+    for v_entry in v_entries:
+        if count is not None:
+            if count <= 0:
+                break
+            count -= 1
+        rel_date = v_entry.date if v_entry.date else "Unreleased"
+        print("%10s: %s" % (rel_date, v_entry.version))
+    return 0
+
+def cmd_stats(cmd, argv):
+    """
+    Prints the release statistics as text or JSON.
+    """
+    stats_format = "text"
+    try:
+        opt_tuple_list, argv = getopt.getopt(argv, "", ["format="])
+    except getopt.GetoptError as exc:
+        raise CmdException("%s: %s" % (cmd, exc))
+    for _, value in opt_tuple_list:
+        stats_format = value
+    if stats_format not in ("text", "json"):
+        raise CmdException("%s: Unknown format: %s" % (cmd, stats_format))
+    assert_no_args(cmd, argv)
+
+    from datetime import date # pylint: disable=import-outside-toplevel
+    clg = load_validated(with_body=False, with_scm=False)
+    stats = release_stats(clg, date.today())
+    if stats_format == "json":
+        import json # pylint: disable=import-outside-toplevel
+        stats["file"] = CONFIG.changelog
+        sys.stdout.write(json.dumps(stats) + "\n")
+        return 0
+
+    print("Releases:          %d (%d prereleases)" % (stats["releases"], stats["prereleases"]))
+    if stats["releases"]:
+        print("First release:     %s" % stats["first_release"])
+        print("Latest release:    %s" % stats["latest_release"])
+    if stats["interval_days"]:
+        print("Days between releases: %s" %
+              ", ".join("%s %s" % (key, value) for key, value in stats["interval_days"].items()))
+    if stats["releases_per_year"]:
+        print("Releases per year: %s" %
+              ", ".join("%s: %d" % (year, count) for year, count in stats["releases_per_year"].items()))
+    print("Release types:     %s" % ", ".join("%s %d" % (key, value) for key, value in stats["types"].items()))
+    unreleased = stats["unreleased"]
+    if unreleased:
+        if unreleased["open_days"] is None:
+            print("Unreleased:        %s" % unreleased["version"])
+        else:
+            print("Unreleased:        %s, open for %d days" % (unreleased["version"], unreleased["open_days"]))
+    return 0
+
+def cmd_batch(cmd, argv):
+    """
+    Runs "validate" or "ready" for multiple changelogs in parallel.
+    Requires the command and files or directories as parameter.
+    """
+    jobs = None
+    try:
+        opt_tuple_list, argv = getopt.getopt(argv, "j:")
+        for _, value in opt_tuple_list:
+            jobs = int(value)
+            if jobs < 1:
+                raise CmdException("%s: Invalid number of jobs: %s" % (cmd, value))
+    except (getopt.GetoptError, ValueError) as exc:
+        raise CmdException("%s: %s" % (cmd, exc))
+    if len(argv) < 2:
+        raise CmdException("Command \"%s\" needs a command and at least one file or directory" % cmd)
+    batch_cmd = argv.pop(0)
+    if batch_cmd not in BATCH_COMMANDS:
+        raise CmdException("Command \"%s\" does not support \"%s\"" % (cmd, batch_cmd))
+    files = find_changelogs(argv)
+    if not files:
+        raise CmdException("No CHANGELOG.md found")
+
+    # read the tags before starting the workers, so every repository is only
+    # read once
+    tasks = []
+    for filename in files:
+        scm = get_scm(os.path.dirname(os.path.abspath(filename)))
+        if scm:
+            get_scm_tag_index(os.path.dirname(os.path.abspath(filename)), scm)
+        tasks.append((batch_cmd, filename, scm))
+
+    pool = None
+    if jobs == 1 or len(tasks) == 1:
+        results = (batch_run(task) for task in tasks)
+    else:
+        import multiprocessing # pylint: disable=import-outside-toplevel
+        pool = multiprocessing.Pool(jobs, batch_init, (CONFIG, SCM_TAG_INDEX))
+        results = pool.imap(batch_run, tasks)
+
+    ok_msg, failed_msg = BATCH_COMMANDS[batch_cmd]
+    failed = 0
+    try:
+        for filename, success, output in results:
+            sys.stderr.write(output)
+            info("%s: %s" % (filename, ok_msg if success else failed_msg))
+            if not success:
+                failed += 1
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    info("%d changelogs checked, %d failed" % (len(tasks), failed))
+    return 1 if failed else 0
+
+def cmd_serve(cmd, argv):
+    """
+    Runs a server for the commands in SERVE_COMMANDS on a Unix socket.
+    Optional parameter: The socket.
+    """
+    # pylint: disable=import-outside-toplevel
+    import socket
+    import signal
+    if len(argv) > 1:
+        raise CmdException("Invalid number of arguments for command \"%s\"" % cmd)
+    socket_path = argv[0] if argv else CONFIG.socket
+    if not socket_path:
+        raise CmdException("Command \"%s\": No socket given" % cmd)
+    socket_path = os.path.abspath(socket_path)
+
+    if os.path.exists(socket_path):
+        with closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as sock:
+            try:
+                sock.connect(socket_path)
+                raise CmdException("Server already running on %s" % socket_path)
+            except socket.error:
+                debug("Removing stale socket %s", socket_path)
+                os.remove(socket_path)
+
+    def terminate(signum, frame):
+        # pylint: disable=unused-argument
+        raise KeyboardInterrupt()
+    signal.signal(signal.SIGTERM, terminate)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path)
+        server.listen(16)
+        info("Listening on %s" % socket_path)
+        # requests are handled one after the other, as commands use the
+        # global CONFIG and sys.stdout
+        while True:
+            conn = server.accept()[0]
+            # a client that doesn't send its request must not block the server
+            conn.settimeout(SERVE_REQUEST_TIMEOUT)
+            try:
+                with closing(conn), conn.makefile("rwb") as stream:
+                    stream.write(serve_request(stream.readline(SERVE_MAX_REQUEST + 1)))
+            except socket.error as exc:
+                debug("Handling request failed: %s", exc)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    info("Server stopped")
+    return 0
+
+def cmd_watch(cmd, argv):
+    """
+    Validates CHANGELOG.md whenever it or the SCM tags change until it is
+    interrupted. Optional "--interval SECONDS" sets the poll interval.
+    """
+    interval = 0.5
+    try:
+        opt_tuple_list, argv = getopt.getopt(argv, "", ["interval="])
+        for _, value in opt_tuple_list:
+            interval = float(value)
+    except (getopt.GetoptError, ValueError) as exc:
+        raise CmdException("%s: %s" % (cmd, exc))
+    assert_no_args(cmd, argv)
+    assert_no_stdin(cmd)
+
+    filename = CONFIG.changelog
+    clg = None
+    file_state = None
+    try:
+        while True:
+            try:
+                stat = os.stat(filename)
+                new_state = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                # e.g. while an editor replaces the file
+                new_state = file_state
+            tags_changed = refresh_served_tags()
+            if new_state != file_state or tags_changed:
+                file_state = new_state
+                if tags_changed and clg:
+                    clg.findings = {}
+                valid = False
+                try:
+                    if clg is None:
+                        clg = ChangeLog(filename, with_body=False, incremental=True)
+                    else:
+                        clg.reload()
+                    valid = clg.validate()
+                except ValidateException as exc:
+                    error(str(exc))
+                except IOError as exc:
+                    error(str(exc))
+                # remember the state of the tags read by the validation
+                refresh_served_tags()
+                info("%s %s" % (time.strftime("%H:%M:%S"), "VALID" if valid else "INVALID"))
+                sys.stdout.flush()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+# Commands supporting functions
+
+# Percentiles of the days between releases reported by "stats"
+STATS_PERCENTILES = (25, 50, 75, 90)
+
+def release_stats(clg, today):
+    """
+    Returns the release statistics of the given ChangeLog as dict for the
+    command "stats". today is the datetime.date to compute the age of the
+    unreleased version.
+    """
+    from datetime import date # pylint: disable=import-outside-toplevel
+    days = []
+    years = {}
+    types = {"initial": 0, "major": 0, "minor": 0, "patch": 0, "prerelease": 0}
+    prereleases = 0
+    unreleased = None
+    previous = None
+    # oldest version first
+    for vers in reversed(clg.version_list):
+        v_entry = clg.version_dict[vers]
+        if not v_entry.date:
+            unreleased = vers.version
+            continue
+        try:
+            days.append(date.fromisoformat(v_entry.date).toordinal())
+        except ValueError:
+            raise ValidateException(v_entry, "Invalid release date: %s" % v_entry.date)
+        year = v_entry.date[:4]
+        years[year] = years.get(year, 0) + 1
+        if vers.prerelease:
+            prereleases += 1
+            types["prerelease"] += 1
+            continue
+        if previous is None:
+            types["initial"] += 1
+        elif vers.major != previous.major:
+            types["major"] += 1
+        elif vers.minor != previous.minor:
+            types["minor"] += 1
+        else:
+            types["patch"] += 1
+        previous = vers
+
+    days.sort()
+    intervals = sorted(later - earlier for earlier, later in zip(days, days[1:]))
+    interval_days = {}
+    if intervals:
+        interval_days["min"] = intervals[0]
+        for pct in STATS_PERCENTILES:
+            interval_days["p%d" % pct] = percentile(intervals, pct)
+        interval_days["max"] = intervals[-1]
+        interval_days["mean"] = round(float(sum(intervals)) / len(intervals), 1)
+    per_year = {}
+    if years:
+        # including the years without release
+        for year in range(int(min(years)), int(max(years)) + 1):
+            per_year[str(year)] = years.get(str(year), 0)
+    return {
+        "releases": len(days),
+        "prereleases": prereleases,
+        "first_release": date.fromordinal(days[0]).isoformat() if days else None,
+        "latest_release": date.fromordinal(days[-1]).isoformat() if days else None,
+        "interval_days": interval_days,
+        "releases_per_year": per_year,
+        "types": types,
+        "unreleased": {"version": unreleased,
+                       "open_days": today.toordinal() - days[-1] if days else None} if unreleased else None,
+    }
+
+def percentile(values, pct):
+    """
+    Returns the percentile pct (0-100) of the sorted list values. Values
+    between two elements are interpolated linearly.
+    """
+    pos = (len(values) - 1) * pct / 100.0
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    result = values[low] + (values[high] - values[low]) * (pos - low)
+    return int(result) if result == int(result) else round(result, 1)
+
+# Commands supported by "batch" with the status messages for success and failure
+BATCH_COMMANDS = {"validate": ("VALID", "INVALID"), "ready": ("YES", "NO")}
+
+def batch_init(config, tag_index):
+    """ Initializes a worker process of the command "batch". """
+    # pylint: disable=global-statement
+    global CONFIG
+    CONFIG = config
+    SCM_TAG_INDEX.update(tag_index)
+
+def batch_run(task):
+    """
+    Runs a command for one changelog for the command "batch".
+    task is a tuple (command, filename, scm). Returns the tuple (filename,
+    success, output).
+    """
+    batch_cmd, filename, scm = task
+    # suppress the info output of the command, it is reported by cmd_batch
+    config = CONFIG._replace(changelog=filename, scm=scm, quiet=max(CONFIG.quiet, 1))
+    exit_code, output = run_command([batch_cmd], config)
+    return filename, exit_code == 0, output
+
+def find_changelogs(paths):
+    """
+    Returns the given files and the CHANGELOG.md files found in the given
+    directories. Hidden directories are skipped.
+    """
+    files = []
+    seen = set()
+    for path in paths:
+        found = [path]
+        if os.path.isdir(path):
+            found = []
+            for dir_path, dir_names, file_names in os.walk(path):
+                dir_names[:] = sorted(d for d in dir_names if not d.startswith("."))
+                if "CHANGELOG.md" in file_names:
+                    found.append(os.path.join(dir_path, "CHANGELOG.md"))
+        for filename in found:
+            real_path = os.path.realpath(filename)
+            if real_path not in seen:
+                seen.add(real_path)
+                files.append(filename)
+    return files
+
+def entry_digests(filename, lines):
+    """
+    Parses the given lines of a changelog and returns a dict with a hash for
+    every entry (in file order) for the command "diff". The keys are the
+    version strings, "title" and "link [LABEL]" for links that are not
+    compare links. The hash of a version includes its compare link.
+    """
+    import hashlib # pylint: disable=import-outside-toplevel
+    parts = {}
+    for entry in parse_changelog(filename, lines=lines):
+        if isinstance(entry, Title):
+            key = "title"
+        elif isinstance(entry, (VersionEntry, Link)) and entry.version:
+            key = entry.version.version
+        elif isinstance(entry, Link):
+            key = "link [%s]" % entry.label
+        else:
+            continue
+        parts.setdefault(key, []).append(str(entry))
+    return {key: hashlib.blake2b("\n".join(texts).encode("utf-8"), digest_size=16).digest()
+            for key, texts in parts.items()}
+
+
+# Commands executed by the server started with "serve"
+SERVE_COMMANDS = ("info", "notes", "versions", "validate", "ready")
+
+# Config fields not sent to the server. See forward_command().
+SERVE_LOCAL_FIELDS = ("scm", "socket", "startup_profile", "timings")
+
+# Seconds the server waits for a request
+SERVE_REQUEST_TIMEOUT = 5
+
+# Seconds the client waits for the server before executing the command locally
+SERVE_RESPONSE_TIMEOUT = 15
+
+# Maximum size of a request in bytes
+SERVE_MAX_REQUEST = 1024 * 1024
+
+def serve_request(request):
+    """
+    Executes a request for the command "serve" and returns the response.
+    The request is a JSON object with the command line ("argv"), the working
+    directory ("cwd") and the client Config fields ("config"). The response
+    is a JSON object with the exit code ("exit") and the output ("stdout"
+    and "stderr").
+    """
+    import json # pylint: disable=import-outside-toplevel
+    out = StringIO()
+    err = StringIO()
+    config = None
+    try:
+        if len(request) > SERVE_MAX_REQUEST:
+            raise CmdException("Request too large")
+        request = json.loads(request.decode("utf-8"))
+        argv = request["argv"]
+        if not argv or argv[0] not in SERVE_COMMANDS:
+            raise CmdException("Command not supported by server: %s" % " ".join(argv))
+        # the server keeps its working directory: paths are relative to the
+        # one of the client
+        config = make_config(**request["config"])
+        config = config._replace(changelog=os.path.join(request["cwd"], config.changelog),
+                cache_dir=config.cache_dir and os.path.join(request["cwd"], config.cache_dir))
+        refresh_served_tags()
+        debug("Request: %s", " ".join(argv))
+        exit_code = run_captured(argv, config, out, err)
+        # remember the state of new tag indexes
+        refresh_served_tags()
+    except Exception as exc: # pylint: disable=broad-except
+        # the server must survive any problem with a request
+        err.write("ERROR: %s\n" % exc)
+        exit_code = 1
+    response = {"exit": exit_code, "stdout": out.getvalue(), "stderr": err.getvalue()}
+    if config:
+        # show the file name given by the client, as if executed locally
+        for key in ("stdout", "stderr"):
+            response[key] = response[key].replace(config.changelog, request["config"]["changelog"])
+    return json.dumps(response).encode("utf-8")
+
+def refresh_served_tags():
+    """
+    Removes the tag indexes of repositories whose tags changed since the
+    index was read and the changelogs validated with them. Returns the
+    working directories of these repositories.
+    """
+    stale = []
+    for working_dir in list(SCM_TAG_INDEX):
+        repo = GitRepo.find(working_dir)
+        refs_state = repo.refs_state() if repo else None
+        if SERVED_REFS_STATE.setdefault(working_dir, refs_state) != refs_state:
+            stale.append(working_dir)
+    for working_dir in stale:
+        debug("Tags changed: %s", working_dir)
+        del SCM_TAG_INDEX[working_dir]
+        del SERVED_REFS_STATE[working_dir]
+        for key in [k for k in CHANGELOG_CACHE if os.path.dirname(k[0]) == working_dir]:
+            del CHANGELOG_CACHE[key]
+    return stale
+
+def load_validated(with_body=True, cached=True, with_scm=True):
+    """
+    Loads the configured changelog file and throws a ValidateException if the
+    file is detected as invalid.
+    Use cached=False if the ChangeLog will be modified.
+    Use with_scm=False if the command doesn't need the SCM. Then the SCM tags
+    are not validated.
+    """
+    config = CONFIG if with_scm else CONFIG._replace(scm=None)
+    if cached:
+        clg = load_changelog(CONFIG.changelog, with_body, config)
+    else:
+        clg = ChangeLog(CONFIG.changelog, with_body, config)
+    if (not clg.valid) and (not CONFIG.ignore_invalid):
+        raise CmdException("%s: File is invalid - check with \"validate\" or use \"-i\"" % CONFIG.changelog)
+    return clg
+
+def assert_no_args(cmd, argv):
+    """ Asserts that argv is empty. """
+    if len(argv) != 0:
+        raise CmdException("Command \"%s\" does not support arguments." % cmd)
+
+def assert_no_stdin(cmd):
+    """ Asserts that the changelog is not read from stdin. """
+    if CONFIG.changelog == STDIN_FILE:
+        raise CmdException("Command \"%s\" can't read the change log from stdin." % cmd)
+
+def assert_arg_count(cmd, argv, count):
+    """ Asserts that argv contains the given number of elements. """
+    if len(argv) != count:
+        raise CmdException("Invalid number of arguments for command \"%s\": Expected %d, got %d"
+                % (cmd, count, len(argv)))
+
+#---------[ Functions ]--------------------------------------------------------
+
+def make_config(**kwargs):
+    """
+    Returns a Config for library use. Fields not given are taken from the
+    default configuration. If "scm" is not given, it is detected when needed
+    (unless use_scm=False is given).
+    """
+    config = DEFAULT_CONFIG._replace(**kwargs)
+    if "scm" not in kwargs:
+        config = config._replace(scm=SCM_AUTO if config.use_scm else None)
+    return config
+
+def load_changelog(filename, with_body=True, config=None):
+    """
+    Returns the ChangeLog for the given file. Uses the given Config or the
+    global CONFIG.
+    The ChangeLog is cached and only loaded again if size or modification
+    time of the file or the Config changed. The returned ChangeLog is shared
+    -- don't modify it.
+    """
+    config = config or CONFIG
+    if filename == STDIN_FILE:
+        return ChangeLog(filename, with_body, config)
+    stat = os.stat(filename)
+    state = (stat.st_mtime_ns, stat.st_size, config)
+    path = os.path.abspath(filename)
+    # a changelog loaded with body can also be used without
+    for key in ((path, True), (path, with_body)):
+        cached = CHANGELOG_CACHE.get(key)
+        if cached and cached[0] == state:
+            return cached[1]
+    clg = ChangeLog(filename, with_body, config)
+    CHANGELOG_CACHE[(path, with_body)] = (state, clg)
+    return clg
+
+def run_command(argv, config=None):
+    """
+    Runs a command (with parameters, like on the command line after the
+    options) with the given Config or the global CONFIG. Returns the tuple
+    (exit code, output). The output contains stdout and stderr.
+    """
+    output = StringIO()
+    exit_code = run_captured(argv, config, output, output)
+    return exit_code, output.getvalue()
+
+def run_captured(argv, config, stdout, stderr):
+    """
+    Runs a command like run_command(), but writes the output to the given
+    streams. Returns the exit code.
+    """
+    # pylint: disable=global-statement
+    global CONFIG
+    saved = (CONFIG, sys.stdout, sys.stderr)
+    CONFIG = config or CONFIG
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        exit_code = execute_command(list(argv))
+    finally:
+        CONFIG, sys.stdout, sys.stderr = saved
+    return exit_code
+
+def forward_command(argv):
+    """
+    Sends the command to the server on the configured socket (see "serve")
+    and prints its output. Returns the exit code or None if the server is not
+    running or doesn't answer in time (SERVE_RESPONSE_TIMEOUT).
+    """
+    # pylint: disable=import-outside-toplevel
+    import json
+    import socket
+    fields = dict((k, v) for k, v in CONFIG._asdict().items() if k not in SERVE_LOCAL_FIELDS)
+    request = json.dumps({"argv": argv, "cwd": os.getcwd(), "config": fields}) + "\n"
+    try:
+        with closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as sock:
+            sock.settimeout(SERVE_RESPONSE_TIMEOUT)
+            sock.connect(CONFIG.socket)
+            sock.sendall(request.encode("utf-8"))
+            sock.shutdown(socket.SHUT_WR)
+            with sock.makefile("rb") as rfile:
+                response = json.loads(rfile.read().decode("utf-8"))
+    except (socket.error, ValueError) as exc:
+        debug("Server on %s not usable -- executing locally: %s", CONFIG.socket, exc)
+        return None
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["exit"]
+
+def line_type(line):
+    """
+    Returns the type of the given (right-stripped) line: LINE_H1, LINE_H2,
+    LINE_LINK, LINE_COMMENT or LINE_TEXT.
+    """
+    # Only lines starting with "#" or "[" might be something else than text
+    first = line[:1]
+    if first == "#" or first == "[":
+        match = LINE_TYPE_RE.match(line)
+        if match:
+            return match.lastgroup
+    return LINE_TEXT
+
+def parse_changelog(filename, with_body=True, lines=None, config=None, first_line=1):
+    """
+    Parses a CHANGELOG.md and yields its entries as soon as they are
+    complete: Title, VersionEntry and Link. A comment at the end of the
+    file is yielded as Comment, all other comments are part of the section
+    body.
+    If with_body is False, the section bodies are not stored.
+    If lines is given, they are parsed instead of the content of the file.
+    first_line is the line number of the first line.
+    Uses the given Config or the global CONFIG.
+    The file is read line by line, so only the current section is kept in
+    memory. See parse_changelog_buffer() to parse a file that is entirely
+    kept in memory.
+    """
+    # pylint: disable=too-many-branches
+    # Parsing Markdown requires that
+    if lines is None and filename == STDIN_FILE:
+        lines = TextIOWrapper(BytesIO(read_stdin()), encoding=locale.getpreferredencoding(False))
+    if lines is None:
+        with open(filename, "r") as inputfile:
+            for entry in parse_changelog(filename, with_body, inputfile, config, first_line):
+                yield entry
+        return
+
+    trace = CONFIG.debug > 1
+    sec = None
+    body = []
+    comment = None
+    started = False
+    line_num = first_line - 1
+    for line in lines:
+        if comment:
+            if isinstance(sec, Section):
+                if with_body:
+                    body.append(comment.text)
+                comment = None
+            else:
+                raise ValidateException(FileLocation(filename, line_num), "Stray comment - don't know how to handle")
+
+        line_num += 1
+        line = line.rstrip()
+        if not line and not started:
+            continue
+        ltype = line_type(line)
+        if trace:
+            debug2("Read %s >>%s<<", ltype, line)
+        if ltype == LINE_TEXT:
+            if isinstance(sec, Section):
+                if with_body:
+                    body.append(line)
+            elif line != "":
+                raise ValidateException(FileLocation(filename, line_num), "%s does not support body: %s" %
+                        (sec.__class__.__name__, line))
+        elif ltype == LINE_COMMENT:
+            comment = Comment(filename, line_num, line)
+        else:
+            if isinstance(sec, Section):
+                if body:
+                    sec.set_body("\n".join(body))
+                    body = []
+                yield sec
+            sec = None
+            started = True
+            if ltype == LINE_H1:
+                sec = Title(filename, line_num, line)
+            elif ltype == LINE_H2:
+                sec = VersionEntry(filename, line_num, line)
+            else:
+                yield Link(filename, line_num, line, config)
+
+    if isinstance(sec, Section):
+        if body:
+            sec.set_body("\n".join(body))
+        yield sec
+    if comment:
+        yield comment
+
+def parse_changelog_buffer(filename, text, with_body=True, config=None, first_line=1):
+    """
+    Parses the decoded content of a CHANGELOG.md like parse_changelog().
+    Only the lines starting with "#" or "[" are looked at. The sections just
+    store the offsets of their bodies in text, that is shared by all
+    sections. See Section.set_body_span().
+    """
+    trace = CONFIG.debug > 1
+    sec = None
+    # start of the lines not yet handled and their line number
+    pos = 0
+    line_num = first_line
+    for match in LINE_START_RE.finditer(text):
+        line = match.group().rstrip()
+        ltype = line_type(line)
+        if ltype in (LINE_TEXT, LINE_COMMENT):
+            continue
+        start = match.start()
+        if isinstance(sec, Section):
+            if with_body:
+                sec.set_body_span(text, pos, start)
+        elif start > pos:
+            _check_no_body(filename, sec, text[pos:start], line_num)
+        line_num += text.count("\n", pos, start)
+        if trace:
+            debug2("Read %s >>%s<< in line %d", ltype, line, line_num)
+        if isinstance(sec, Section):
+            yield sec
+        sec = None
+        if ltype == LINE_H1:
+            sec = Title(filename, line_num, line)
+        elif ltype == LINE_H2:
+            sec = VersionEntry(filename, line_num, line)
+        else:
+            yield Link(filename, line_num, line, config)
+        pos = min(match.end() + 1, len(text))
+        line_num += 1
+
+    # A comment in the last line of the file is not part of a section
+    end = len(text)
+    last = (text.rfind("\n", pos, end - 1) + 1) or pos
+    comment = None
+    if end > pos and text[last:last + 4] == "[//]" and line_type(text[last:end].rstrip()) == LINE_COMMENT:
+        comment = Comment(filename, line_num + text.count("\n", pos, last), text[last:end].rstrip())
+        end = last
+    if isinstance(sec, Section):
+        if with_body:
+            sec.set_body_span(text, pos, end)
+        yield sec
+    elif end > pos:
+        _check_no_body(filename, sec, text[pos:end], line_num)
+    if comment:
+        yield comment
+
+def _check_no_body(filename, sec, text, line_num):
+    """
+    Checks the lines in text following sec (None or a Link) for
+    parse_changelog_buffer(): Only empty lines are allowed. (A comment in the last
+    line of the file is not passed.) line_num is the line number of the
+    first line.
+    """
+    for line in text.split("\n"):
+        line = line.rstrip()
+        if line_type(line) == LINE_COMMENT:
+            raise ValidateException(FileLocation(filename, line_num), "Stray comment - don't know how to handle")
+        if line != "":
+            raise ValidateException(FileLocation(filename, line_num), "%s does not support body: %s" %
+                    (sec.__class__.__name__, line))
+        line_num += 1
+
+@timed("load")
+def scan_version_body(filename, version_str):
+    """
+    Returns the same as ChangeLog.version_body(), but without loading the
+    entire file. The file is memory mapped and only the header lines and the
+    body of the requested version are decoded. The file is not validated.
+    """
+    version = Version(version_str)
+    encoding = locale.getpreferredencoding(False)
+    with open(filename, "rb") as inputfile:
+        if os.fstat(inputfile.fileno()).st_size == 0:
+            return None
+        with closing(mmap.mmap(inputfile.fileno(), 0, access=mmap.ACCESS_READ)) as data:
+            size = len(data)
+            # only decode header lines that might contain the version
+            needle = b"" if version.version == "Unreleased" else version.version.encode(encoding)
+            # check the lines starting with "##" for the version header
+            start = 0
+            while start >= 0:
+                end = data.find(b"\n", start)
+                end = size if end < 0 else end + 1
+                if data[start:start + 2] == b"##" and data.find(needle, start, end) >= 0:
+                    line = data[start:end].decode(encoding).rstrip()
+                    match = VERS_HDR_RE.match(line)
+                    if match and line_type(line) == LINE_H2 and Version(match.group("version")) == version:
+                        return _scan_body(data, end, encoding)
+                start = data.find(b"\n##", end - 1)
+                if start >= 0:
+                    start += 1
+    return None
+
+def _scan_body(data, start, encoding):
+    """ Returns the body of the section starting at the given offset. See scan_version_body(). """
+    # find the end of the section, only lines starting with "#" or "[" are
+    # decoded
+    size = len(data)
+    sec_end = start
+    while sec_end < size:
+        end = data.find(b"\n", sec_end)
+        end = size if end < 0 else end + 1
+        if data[sec_end:sec_end + 1] in (b"#", b"["):
+            ltype = line_type(data[sec_end:end].decode(encoding).rstrip())
+            if ltype in (LINE_H1, LINE_H2, LINE_LINK):
+                break
+            # A comment in the last line of the file is not part of the section
+            if ltype == LINE_COMMENT and end == size:
+                break
+        sec_end = end
+    sec = Section(None, 0)
+    sec.set_body(data[start:sec_end].decode(encoding))
+    return sec.body()
+
+def error(message):
+    """ Print a error message with prefix "ERROR:" to stderr. """
+    # there might be error messages before CONFIG is created
+    if (not CONFIG) or CONFIG.quiet < 3:
+        print_stderr("ERROR: %s" % message)
+
+def warning(message):
+    """ Print a warning message with prefix "WARNING:" to stderr. """
+    if CONFIG.quiet < 2:
+        print_stderr("WARNING: %s" % message)
+
+def info(message):
+    """ Print a info message to stdout (to stderr with "--stdout"). """
+    if CONFIG.quiet < 1:
+        if CONFIG.stdout:
+            print_stderr("%s" % message)
+        else:
+            print("%s" % message)
+
+def debug(message, *args):
+    """
+    If debug level is greater 0, print a debug message with prefix "DEBUG:" to
+    stderr. If args are given, the message is formatted with them, but only
+    if the message is printed.
+    """
+    if CONFIG.debug > 0:
+        print_stderr("DEBUG: %s" % (message % args if args else message))
+
+def debug2(message, *args):
+    """ Like debug(), but only if debug level is greater 1. """
+    if CONFIG.debug > 1:
+        print_stderr("DEBUG: %s" % (message % args if args else message))
+
+def read_changelog_text(filename):
+    """ Returns the decoded content of the given changelog file or of stdin. """
+    if filename == STDIN_FILE:
+        return TextIOWrapper(BytesIO(read_stdin()), encoding=locale.getpreferredencoding(False)).read()
+    with open(filename, "r") as inputfile:
+        return inputfile.read()
+
+def read_stdin():
+    """ Returns the content of stdin as bytes. Stdin is only read once. """
+    # pylint: disable=global-statement
+    global STDIN_DATA
+    if STDIN_DATA is None:
+        STDIN_DATA = sys.stdin.buffer.read()
+    return STDIN_DATA
+
+def print_stderr(message):
+    """ Prints to stderr. """
+    print(message, file=sys.stderr)
+
+def run_cmd(os_cmd, cwd):
+    """ Run command and return stdout """
+    import subprocess # pylint: disable=import-outside-toplevel
+    prc = subprocess.Popen(os_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, shell=True, cwd=cwd)
+    output = prc.communicate()[0]
+    out = output.decode(locale.getpreferredencoding(False)).rstrip()
+    debug("%s: Exit-Code: %d Output: >>%s<<", os_cmd, prc.returncode, out)
+    return out
+
+def git_cat_files(objects, cwd):
+    """
+    Reads the given GIT objects (e.g. "HEAD:./CHANGELOG.md") with one
+    "git cat-file --batch" process. Returns a list with the content of each
+    object as bytes or None if the object does not exist.
+    """
+    import subprocess # pylint: disable=import-outside-toplevel
+    request = "".join("%s\n" % obj for obj in objects).encode(sys.getfilesystemencoding())
+    prc = subprocess.Popen(["git", "cat-file", "--batch"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, cwd=cwd)
+    output, err = prc.communicate(request)
+    debug("git cat-file --batch: Exit-Code: %d", prc.returncode)
+    if prc.returncode != 0:
+        raise CmdException("git cat-file failed: %s" % err.decode(locale.getpreferredencoding(False)).strip())
+    contents = []
+    pos = 0
+    for _ in objects:
+        end = output.index(b"\n", pos)
+        header = output[pos:end]
+        pos = end + 1
+        if header.endswith((b" missing", b" ambiguous")):
+            contents.append(None)
+            continue
+        _, obj_type, size = header.split()
+        size = int(size)
+        contents.append(output[pos:pos + size] if obj_type == b"blob" else None)
+        pos += size + 1
+    return contents
+
+@timed("scm")
+def get_scm_tag_date(version, working_dir, config=None):
+    """
+    Returns the date of the tagged version.
+    Uses the given Config or the global CONFIG.
+    """
+    config = config or CONFIG
+    tag_date = None
+    if get_scm(working_dir, config) == Scm.git:
+        if config.tag_index:
+            tag_date = get_scm_tag_index(working_dir, config=config).get("v%s" % version)
+        else:
+            tag_date = run_cmd("git log -1 --date=short --format=%%ad \"v%s\"" %
+                    version, working_dir)
+    return tag_date
+
+@timed("scm")
+def get_scm_tag_index(working_dir, scm=None, config=None):
+    """
+    Returns a dict with the dates of all version tags ("v*") keyed by tag
+    name. The SCM is only queried once per working directory and
+    repository.
+    Uses the given Config or the global CONFIG.
+    Optional: scm The SCM to use instead of the configured one.
+    """
+    config = config or CONFIG
+    scm = scm or get_scm(working_dir, config)
+    if working_dir not in SCM_TAG_INDEX:
+        index = None
+        repo = None
+        refs_state = None
+        if scm == Scm.git and (config.git_native or config.cache):
+            repo = GitRepo.find(working_dir)
+        if repo and repo.common_dir in SCM_TAG_INDEX:
+            # e.g. another changelog in the same repository
+            index = SCM_TAG_INDEX[repo.common_dir]
+        if index is None and repo and config.cache:
+            refs_state = repo.refs_state()
+            index = load_tag_cache(repo, refs_state)
+            if index is not None:
+                refs_state = None
+        if index is None and repo and config.git_native:
+            try:
+                index = repo.tag_dates("v")
+            except (KaclException, EnvironmentError, zlib.error, struct.error, ValueError, IndexError) as exc:
+                debug("Reading GIT repository failed -- falling back to git command: %s", exc)
+        if index is None:
+            index = {}
+            if scm == Scm.git:
+                # Lightweight tags have the author date of the commit, annotated
+                # tags the author date of the tagged ("*") commit.
+                out = run_cmd("git for-each-ref"
+                        " --format='%(refname:strip=2) %(authordate:short) %(*authordate:short)'"
+                        " 'refs/tags/v*'", working_dir)
+                for line in out.splitlines():
+                    fields = line.split()
+                    if len(fields) > 1:
+                        index[fields[0]] = fields[-1]
+        if refs_state:
+            save_tag_cache(repo, refs_state, index)
+        debug("Tag index for %s: %d tags", working_dir, len(index))
+        if repo:
+            SCM_TAG_INDEX[repo.common_dir] = index
+        SCM_TAG_INDEX[working_dir] = index
+    return SCM_TAG_INDEX[working_dir]
+
+def load_tag_cache(repo, refs_state):
+    """
+    Returns the cached tag index of the given repository or None if there is
+    no cache or it is outdated.
+    """
+    import json # pylint: disable=import-outside-toplevel
+    cache_file = os.path.join(repo.common_dir, TAG_CACHE_FILE)
+    try:
+        with open(cache_file, "r") as cfile:
+            cache = json.load(cfile)
+    except (EnvironmentError, ValueError) as exc:
+        debug("No tag cache %s: %s", cache_file, exc)
+        return None
+    if (not isinstance(cache, dict) or cache.get("format") != TAG_CACHE_FORMAT
+            or cache.get("refs_state") != refs_state):
+        debug("Tag cache %s is outdated", cache_file)
+        return None
+    debug("Using tag cache %s", cache_file)
+    return cache["tags"]
+
+def save_tag_cache(repo, refs_state, index):
+    """ Writes the tag index of the given repository to the cache file. """
+    import json # pylint: disable=import-outside-toplevel
+    cache_file = os.path.join(repo.common_dir, TAG_CACHE_FILE)
+    tmp_file = "%s.%d" % (cache_file, os.getpid())
+    try:
+        with open(tmp_file, "w") as cfile:
+            json.dump({"format": TAG_CACHE_FORMAT, "refs_state": refs_state, "tags": index}, cfile)
+        os.rename(tmp_file, cache_file)
+    except EnvironmentError as exc:
+        debug("Can't write tag cache %s: %s", cache_file, exc)
+
+def cache_file_name(filename, config, ext):
+    """
+    Returns the name of the cache file with the given extension (e.g.
+    PARSE_CACHE_FILE_EXT) for the given changelog file. Cache files are not
+    stored in the working tree, see "cache files" in the usage.
+    """
+    import hashlib # pylint: disable=import-outside-toplevel
+    path = os.path.abspath(filename)
+    name = "%s.%s" % (hashlib.sha1(path.encode("utf-8")).hexdigest(), ext)
+    if config.cache_dir:
+        return os.path.join(config.cache_dir, name)
+    repo = GitRepo.find(os.path.dirname(path))
+    if repo:
+        return os.path.join(repo.common_dir, "keepAChangelog." + name)
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "keepAChangelog", name)
+
+def write_cache_file(cache_file, data):
+    """
+    Writes the given string to the given cache file. The cache directory is
+    created if needed. The file is replaced atomically.
+    """
+    tmp_file = "%s.%d" % (cache_file, os.getpid())
+    if not os.path.isdir(os.path.dirname(cache_file)):
+        os.makedirs(os.path.dirname(cache_file))
+    with open(tmp_file, "w") as cfile:
+        cfile.write(data)
+    os.replace(tmp_file, cache_file)
+
+def file_hash(filename):
+    """ Returns a hash of the content of the given file. """
+    import hashlib # pylint: disable=import-outside-toplevel
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as inputfile:
+        for block in iter(lambda: inputfile.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_parse_cache(filename, with_body, config):
+    """
+    Returns the entries of the given changelog file (like parse_changelog())
+    from the parse cache or None if there is no cache or it is outdated.
+    The cache is valid if size and modification time or the content hash
+    of the file are unchanged.
+    """
+    import json # pylint: disable=import-outside-toplevel
+    cache_file = cache_file_name(filename, config, PARSE_CACHE_FILE_EXT)
+    try:
+        with open(cache_file, "r") as cfile:
+            cache = json.load(cfile)
+        stat = os.stat(filename)
+    except (EnvironmentError, ValueError) as exc:
+        debug("No parse cache %s: %s", cache_file, exc)
+        return None
+    if (not isinstance(cache, dict) or cache.get("format") != PARSE_CACHE_FORMAT
+            or cache.get("program_version") != VERSION or (with_body and not cache.get("with_body"))
+            or cache.get("size") != stat.st_size):
+        debug("Parse cache %s is outdated", cache_file)
+        return None
+    if cache.get("mtime_ns") != stat.st_mtime_ns and cache.get("hash") != file_hash(filename):
+        debug("Parse cache %s is outdated", cache_file)
+        return None
+    debug("Using parse cache %s", cache_file)
+    try:
+        return [ENTRY_TYPES[record["type"]].from_dict(filename, record) for record in cache["entries"]]
+    except (KaclException, KeyError, TypeError, AttributeError) as exc:
+        debug("Invalid parse cache %s: %s", cache_file, exc)
+        return None
+
+def save_parse_cache(filename, stat, with_body, entries, config):
+    """
+    Writes the entries of the given changelog file to the parse cache.
+    stat is the result of os.stat() before the file was parsed. The cache is
+    not written if the file changed in the meantime.
+    """
+    import json # pylint: disable=import-outside-toplevel
+    cache_file = cache_file_name(filename, config, PARSE_CACHE_FILE_EXT)
+    try:
+        current = os.stat(filename)
+        if (current.st_mtime_ns, current.st_size) != (stat.st_mtime_ns, stat.st_size):
+            debug("%s changed while parsing -- not caching", filename)
+            return
+        cache = {"format": PARSE_CACHE_FORMAT, "program_version": VERSION, "size": stat.st_size,
+                 "mtime_ns": stat.st_mtime_ns, "hash": file_hash(filename), "with_body": with_body,
+                 "entries": [entry.as_dict() for entry in entries]}
+        write_cache_file(cache_file, json.dumps(cache))
+    except EnvironmentError as exc:
+        debug("Can't write parse cache %s: %s", cache_file, exc)
+
+def load_search_index(filename, config):
+    """
+    Returns the search index of the given changelog file. The index is read
+    from the index file if the content hash of the file is unchanged,
+    otherwise it is created and written to the index file. See
+    build_search_index().
+    """
+    import json # pylint: disable=import-outside-toplevel
+    if filename == STDIN_FILE:
+        return build_search_index(e for e in parse_changelog(filename, config=config) if isinstance(e, VersionEntry))
+    index_file = cache_file_name(filename, config, SEARCH_INDEX_FILE_EXT)
+    content_hash = file_hash(filename)
+    try:
+        with open(index_file, "r") as ifile:
+            index = json.load(ifile)
+        if (isinstance(index, dict) and index.get("format") == SEARCH_INDEX_FORMAT
+                and index.get("program_version") == VERSION and index.get("hash") == content_hash):
+            debug("Using search index %s", index_file)
+            return index
+        debug("Search index %s is outdated", index_file)
+    except (EnvironmentError, ValueError) as exc:
+        debug("No search index %s: %s", index_file, exc)
+
+    entries = (e for e in parse_changelog(filename, config=config) if isinstance(e, VersionEntry))
+    index = build_search_index(entries)
+    index.update({"format": SEARCH_INDEX_FORMAT, "program_version": VERSION, "hash": content_hash})
+    try:
+        # the index is not written if the file changed while indexing
+        if file_hash(filename) == content_hash:
+            write_cache_file(index_file, json.dumps(index))
+    except EnvironmentError as exc:
+        debug("Can't write search index %s: %s", index_file, exc)
+    return index
+
+def build_search_index(v_entries):
+    """
+    Returns the search index for the given version entries as dict with
+    - versions: list of [version, first line] (index into lines) in file order
+    - lines: the body lines of all versions
+    - words: dict of all lowercase words to the sorted list of the lines
+      (index into lines) containing them
+    """
+    versions = []
+    lines = []
+    words = {}
+    for v_entry in v_entries:
+        versions.append([v_entry.version.version, len(lines)])
+        for line in v_entry.body().split("\n"):
+            line_idx = len(lines)
+            lines.append(line)
+            for word in set(WORD_RE.findall(line.lower())):
+                words.setdefault(word, []).append(line_idx)
+    return {"versions": versions, "lines": lines, "words": words}
+
+def search_lines(index, term, word_list):
+    """
+    Returns the set of lines (index into index["lines"]) matching the search
+    term. word_list is the sorted list of the words of the index, it is used
+    for prefix search.
+    """
+    words = WORD_RE.findall(term.lower())
+    if not words:
+        return set()
+    prefix = words[-1] if term.endswith("*") else None
+    found = None
+    for word in words[:-1] if prefix else words:
+        found = set(index["words"].get(word, ())) if found is None else found.intersection(index["words"].get(word, ()))
+    if prefix:
+        start = bisect.bisect_left(word_list, prefix)
+        end = bisect.bisect_left(word_list, prefix + "\U0010ffff")
+        prefixed = set()
+        for word in word_list[start:end]:
+            prefixed.update(index["words"][word])
+        found = prefixed if found is None else found.intersection(prefixed)
+    if len(words) > 1:
+        # check that the words are adjacent in the line
+        found = set(line_idx for line_idx in found if
+                    contains_phrase(WORD_RE.findall(index["lines"][line_idx].lower()), words, prefix))
+    return found
+
+def contains_phrase(line_words, words, prefix):
+    """
+    Returns whether the list line_words contains the list words as sequence.
+    If prefix is given, the last word only needs to start with it.
+    """
+    count = len(words)
+    for start in range(len(line_words) - count + 1):
+        if line_words[start:start + count - 1] == words[:-1]:
+            last = line_words[start + count - 1]
+            if last == words[-1] or (prefix and last.startswith(prefix)):
+                return True
+    return False
+
+@timed("scm")
+def get_scm(working_dir, config=None):
+    """
+    Returns the SCM to use for files in the given directory or None.
+    If the configured SCM is SCM_AUTO, the SCM is detected on first use.
+    Uses the given Config or the global CONFIG.
+    """
+    config = config or CONFIG
+    if config.scm != SCM_AUTO:
+        return config.scm
+    if working_dir not in SCM_DETECTED:
+        SCM_DETECTED[working_dir] = None
+        if config.use_scm and is_git_working_dir(working_dir, config):
+            debug("In git working copy -- enabling scm git")
+            SCM_DETECTED[working_dir] = Scm.git
+    return SCM_DETECTED[working_dir]
+
+def is_git_working_dir(working_dir, config=None):
+    """ Is the given directory located within a GIT working tree? """
+    if (config or CONFIG).git_native:
+        return GitRepo.find(working_dir) is not None
+    out = run_cmd("git rev-parse --is-inside-work-tree", working_dir)
+    return out.strip() == "true"
+
+# Entry classes by the type used by as_dict()
+ENTRY_TYPES = {"title": Title, "version": VersionEntry, "link": Link, "comment": Comment}
+
+#---------[ MAIN ]-------------------------------------------------------------
+
+# scm: (Enum) Scm (e.g.git) to get tags and tag-dates or SCM_AUTO to detect it
+#      when needed. Default: git if in git working dir
+# use_scm: (Bool) Whether to use a SCM if available. Default: True
+# changelog: (String) Name of the change log file to use. Default: CHANGELOG.md
+# ignore_invalid: (Bool) Ignore if file was detected as invalid. Default: False
+# filebackup: (Bool) Whether to create a backuo before writing the file. Default: True
+# quiet: (int) Quiet level.
+# debug: (Bool) Print debug output.
+# tag_index: (Bool) Read all SCM tag dates at once. Default: True
+# git_native: (Bool) Read the GIT repository directly. Default: True
+# cache: (Bool) Use the tag date cache. Default: True
+# fast: (Bool) Don't load the entire file if not needed. Default: False
+# startup_profile: (Bool) Print startup timing. Default: False
+# socket: (String) Unix socket of the server. Default: $KEEPACHANGELOG_SOCKET
+# patch: (Bool) "release" only replaces the changed lines. Default: False
+# fsync: (Bool) Flush written files to disk. Default: False
+# parse_cache: (Bool) Cache the parsed changelog. Default: False
+# cache_dir: (String) Directory of the parse cache. Default: None (next to the file)
+# timings: (String) Format of the timings report ("text" or "json"). Default: None (no report)
+# stdout: (Bool) "rewrite" and "release" write to stdout instead of the file. Default: False
+#
+Config = namedtuple("Config", "scm use_scm changelog ignore_invalid filebackup quiet debug tag_index git_native"
+                   " cache fast startup_profile socket patch fsync parse_cache cache_dir timings stdout")
+DEFAULT_CONFIG = Config(scm=None, use_scm=True, changelog="CHANGELOG.md", ignore_invalid=False,
+            filebackup=True, quiet=0, debug=0, tag_index=True, git_native=True, cache=True, fast=False,
+            startup_profile=False, socket=None, patch=False, fsync=False, parse_cache=False,
+            cache_dir=None, timings=None, stdout=False)
+CONFIG = DEFAULT_CONFIG
+
+def handle_options(sys_argv):
+    """
+    Handle command line options and create global CONFIG named tuple.
+    Returns command list with command and command parameters.
+    Raises a SystemExit(1) on error and SystemExit(0) after processing
+    --version or --help.
+    """
+    # pylint: disable=global-statement
+    # CONFIG is the global configuration namedtuple
+    global CONFIG
+
+    use_scm = True
+    chglog_file = None
+    ignore_invalid = False
+    filebackup = True
+    # quiet level: 0: print all, 1: warnings + error, 2: only errors
+    quiet = 0
+    debug_level = 0
+    tag_index = True
+    git_native = True
+    cache = True
+    fast = False
+    startup_profile = False
+    socket_path = os.environ.get("KEEPACHANGELOG_SOCKET") or None
+    patch = False
+    fsync = False
+    parse_cache = False
+    cache_dir = None
+    timings = None
+    stdout = False
+
+    # parameter handling
+    try:
+        opt_tuple_list, argv = getopt.getopt(sys_argv, "f:nFiBPqdS:",
+                ["help", "version", "file=", "no-scm", "fast", "ignore", "no-file-backup", "quit", "debug",
+                 "no-tag-index", "git-cmd", "no-cache", "startup-profile",
+                 "socket=", "patch", "fsync", "parse-cache", "cache-dir=",
+                 "timings=", "stdout"])
+        for opt_tuple in opt_tuple_list:
+            opt = opt_tuple[0]
+            value = opt_tuple[1]
+            if opt in ("--no-scm", "-n"):
+                use_scm = False
+            elif opt in ("--file", "-f"):
+                if chglog_file:
+                    error("Duplicate option -f")
+                    raise SystemExit(1)
+                chglog_file = value
+            elif opt in ("--fast", "-F"):
+                fast = True
+            elif opt in ("--ignore-invalid", "-i"):
+                ignore_invalid = True
+            elif opt in ("--no-file-backup", "-B"):
+                filebackup = False
+            elif opt in ("--quiet", "-q"):
+                quiet += 1
+            elif opt in ("--debug", "-d"):
+                debug_level += 1
+            elif opt == "--no-tag-index":
+                tag_index = False
+            elif opt == "--git-cmd":
+                git_native = False
+            elif opt == "--no-cache":
+                cache = False
+            elif opt == "--startup-profile":
+                startup_profile = True
+            elif opt in ("--socket", "-S"):
+                socket_path = value
+            elif opt in ("--patch", "-P"):
+                patch = True
+            elif opt == "--fsync":
+                fsync = True
+            elif opt == "--parse-cache":
+                parse_cache = True
+            elif opt == "--cache-dir":
+                parse_cache = True
+                cache_dir = value
+            elif opt == "--timings":
+                if value not in ("text", "json"):
+                    error("Invalid format for --timings: %s" % value)
+                    raise SystemExit(1)
+                timings = value
+            elif opt == "--stdout":
+                stdout = True
+            elif opt == "--help":
+                print(__doc__)
+                raise SystemExit(0)
+            elif opt == "--version":
+                print("%s V %s" % (PROGRAM, VERSION))
+                raise SystemExit(0)
+            else:
+                error("Can't handle option \"%s\" -- implementation error" % opt)
+                raise SystemExit(1)
+    except getopt.GetoptError as exc:
+        error(str(exc))
+        raise SystemExit(1)
+
+    if chglog_file is None:
+        chglog_file = "CHANGELOG.md"
+
+    # The SCM is detected when needed (see get_scm())
+    CONFIG = Config(scm=SCM_AUTO if use_scm else None, use_scm=use_scm, changelog=chglog_file,
+            ignore_invalid=ignore_invalid, filebackup=filebackup, quiet=quiet, debug=debug_level,
+            tag_index=tag_index, git_native=git_native, cache=cache, fast=fast,
+            startup_profile=startup_profile, socket=socket_path, patch=patch, fsync=fsync,
+            parse_cache=parse_cache, cache_dir=cache_dir, timings=timings, stdout=stdout)
+
+
+    debug("Config: %s", CONFIG)
+
+    return argv
+
+
+def main(sys_argv=None):
+    """ Main function. """
+    options_start = time.time()
+    argv = handle_options(sys.argv[1:] if sys_argv is None else sys_argv)
+
+    if len(argv) < 1:
+        error("Missing command")
+        print(__doc__)
+        return 1
+
+    command_start = time.time()
+    TIMINGS.enabled = CONFIG.timings is not None
+    exit_code = None
+    # the server can't read our stdin
+    if CONFIG.socket and argv[0] in SERVE_COMMANDS and CONFIG.changelog != STDIN_FILE:
+        exit_code = forward_command(argv)
+    if exit_code is None:
+        exit_code = execute_command(argv)
+    if CONFIG.startup_profile:
+        print_startup_profile(options_start, command_start, time.time())
+    if CONFIG.timings:
+        print_stderr(TIMINGS.report(CONFIG.timings))
+    return exit_code
+
+def print_startup_profile(options_start, command_start, end):
+    """ Prints the startup profile to stderr. """
+    print_stderr("STARTUP: interpreter start (cpu): %7.1f ms" % (PROFILE_START_CPU * 1000))
+    print_stderr("STARTUP: load module:             %7.1f ms" % ((options_start - PROFILE_START) * 1000))
+    print_stderr("STARTUP: handle options:          %7.1f ms" % ((command_start - options_start) * 1000))
+    print_stderr("STARTUP: execute command:         %7.1f ms" % ((end - command_start) * 1000))
+    print_stderr("STARTUP: total (without interpreter): %.1f ms" % ((end - PROFILE_START) * 1000))
+    print_stderr("STARTUP: loaded modules: %d" % len(sys.modules))
+
+def execute_command(argv):
+    """
+    Executes the command given as first element of argv with the remaining
+    elements as parameters. Returns the exit code.
+    """
+    cmd = argv.pop(0) # pylint: disable=no-member
+
+    exit_code = 1
+    try:
+        cmd_func = "cmd_%s" % cmd.replace("-", "_")
+        if cmd_func in globals():
+            exit_code = globals()[cmd_func](cmd, argv)
+        else:
+            error("Unknown command: %s" %cmd)
+            print(__doc__)
+    except KaclException as exc:
+        error(str(exc))
+    except IOError as exc:
+        error(str(exc))
+
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
+
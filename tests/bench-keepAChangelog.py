@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+#
+# FILE: bench-keepAChangelog.py
+#
+# ABSTRACT: Benchmarks for keepAChangelog.py
+#
+# Generates a realistic CHANGELOG.md (optionally with a GIT repository
+# containing the version tags) and measures how long keepAChangelog.py needs
+# for the commands validate, ready, print, info, release and rewrite. Use
+# "-s" multiple times to compare different versions of the script, e.g. with
+# a version extracted via "git show". The results can be saved as JSON and
+# compared with a previously saved baseline.
+#
+# Not run by runtests.sh.
+#
+# AUTHOR: Ralf Schandl
+#
+
+"""
+Usage: bench-keepAChangelog.py [OPTIONS] [-s SCRIPT]...
+       bench-keepAChangelog.py [OPTIONS] -G DIR
+
+OPTIONS (changelog generation):
+    -n VERSIONS  Number of versions in the generated changelog.
+                 Default: 20000
+    -l LINES     Number of body lines per version. Default: 8
+    -p RATIO     Ratio of prerelease versions (e.g. "2.1.0-rc.1").
+                 Default: 0.1
+    -c RATIO     Ratio of version bodies containing a comment. Default: 0.1
+    -L           Shuffle the links at the end of the file and mix in
+                 reference links that are not compare links.
+    -R           Generate a release-ready changelog without "Unreleased".
+                 Without it, "ready" times the failure path (exit code 1,
+                 as "Unreleased" is not released). With it, "release" fails
+                 (exit code 1, nothing to release).
+    -g           Create a GIT repository with a tag for every released
+                 version. Without it the commands are run with "-n".
+    -G DIR       Only generate CHANGELOG.md (and the GIT repository) in the
+                 given directory and exit.
+
+OPTIONS (benchmark):
+    -s SCRIPT    keepAChangelog.py to benchmark. Can be given multiple
+                 times. Default: ../keepAChangelog.py
+    -C COMMANDS  Comma separated list of the commands to run.
+                 Default: validate,ready,print,info,release,rewrite
+    -r RUNS      Number of runs per script and command. The best run is
+                 reported. Default: 3
+    -k VERSIONS  Number of random versions to sort with the class Version of
+                 the script. 0 to skip. Default: 100000
+    -o FILE      Write the results as JSON to FILE.
+    -b FILE      Compare the results with the baseline in FILE (written with
+                 "-o"). Exits with 1 if a command is slower than the
+                 baseline by more than the threshold.
+    -t PERCENT   Threshold for "-b" in percent. Default: 10
+
+BASELINE:
+    No baseline is stored in the repository, as the timings depend on the
+    machine. Create one on your machine with the script of a previous
+    commit and the same options, e.g.:
+
+        git worktree add --detach /tmp/kacl-base HEAD~1
+        bench-keepAChangelog.py -s /tmp/kacl-base/keepAChangelog.py -o /tmp/baseline.json
+        git worktree remove /tmp/kacl-base
+        bench-keepAChangelog.py -b /tmp/baseline.json
+
+    A script not found in the baseline is compared with the first script
+    of the baseline.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import getopt
+import json
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+ALL_COMMANDS = ["validate", "ready", "print", "info", "release", "rewrite"]
+
+# Commands that modify the file, they get a fresh copy for every run
+WRITING_COMMANDS = ("release", "rewrite")
+
+# lines for the generated bodies
+BODY_HEADERS = ["### Added", "### Changed", "### Fixed", "### Removed"]
+BODY_LINES = [
+    "- Support for [feature](https://example.com/feature) with some text",
+    "- Another feature",
+    "- Crash when doing something `special`",
+    "- Bug #1234 in module x",
+    "- Updated dependency foo to 2.3.4",
+    "- Documentation for the option `--bar`",
+]
+
+REPO_URL = "https://github.com/example/project"
+
+
+def generate_versions(count, prerelease_ratio, rnd):
+    """
+    Returns count version strings in descending order. Prereleases are
+    followed (in ascending order) by the release of the same version.
+    """
+    versions = []
+    major, minor, patch = 0, 1, 0
+    while len(versions) < count:
+        if rnd.random() < 0.02:
+            major, minor, patch = major + 1, 0, 0
+        elif rnd.random() < 0.2:
+            minor, patch = minor + 1, 0
+        else:
+            patch += 1
+        release = "%d.%d.%d" % (major, minor, patch)
+        if rnd.random() < prerelease_ratio:
+            for num in range(1, rnd.randint(1, 3) + 1):
+                versions.append("%s-rc.%d" % (release, num))
+        versions.append(release)
+    versions = versions[:count]
+    versions.reverse()
+    return versions
+
+
+def generate_changelog(directory, versions_count=20000, body_lines=8, prerelease_ratio=0.1,
+                       comment_ratio=0.1, mix_links=False, release_ready=False, seed=42):
+    """
+    Writes CHANGELOG.md to the given directory. Returns the list of the
+    tuples (version, date) in the file order (after "Unreleased"). With
+    release_ready the file has no "Unreleased" version.
+    """
+    rnd = random.Random(seed)
+    versions = generate_versions(versions_count, prerelease_ratio, rnd)
+    date = datetime(2024, 1, 1)
+    entries = []
+    for version in versions:
+        entries.append((version, date.strftime("%Y-%m-%d")))
+        date -= timedelta(days=rnd.randint(0, 3))
+
+    with open(os.path.join(directory, "CHANGELOG.md"), "w") as out:
+        out.write("# Changelog\nAll notable changes to this project will be documented in this file.\n\n")
+        out.write("The format is based on [Keep a Changelog](https://keepachangelog.com/en/1.0.0/).\n\n")
+        if not release_ready:
+            out.write("## [Unreleased]\n")
+            out.write(generate_body(body_lines, comment_ratio, rnd))
+        for version, version_date in entries:
+            out.write("## [%s] - %s\n" % (version, version_date))
+            out.write(generate_body(body_lines, comment_ratio, rnd))
+
+        links = []
+        if not release_ready:
+            links.append("[Unreleased]: %s/compare/v%s...HEAD\n" % (REPO_URL, versions[0]))
+        for idx, (version, _) in enumerate(entries):
+            previous = entries[idx + 1][0] if idx + 1 < len(entries) else "0.0.0"
+            links.append("[%s]: %s/compare/v%s...v%s\n" % (version, REPO_URL, previous, version))
+        if mix_links:
+            links.extend("[issue-%d]: %s/issues/%d\n" % (num, REPO_URL, num)
+                         for num in range(len(entries) // 10))
+            rnd.shuffle(links)
+        out.writelines(links)
+        out.write("\n[//]: # (generated by bench-keepAChangelog.py)\n")
+    return entries
+
+
+def generate_body(body_lines, comment_ratio, rnd):
+    """ Returns a version body with approximately the given number of lines. """
+    lines = []
+    while len(lines) < body_lines:
+        if lines:
+            lines.append("")
+        lines.append(rnd.choice(BODY_HEADERS))
+        lines.extend(rnd.choice(BODY_LINES) for _ in range(rnd.randint(1, 4)))
+    if rnd.random() < comment_ratio:
+        lines.insert(rnd.randint(1, len(lines)), "[//]: # (a comment)")
+    return "\n".join(lines) + "\n\n"
+
+
+def create_git_repo(directory, entries):
+    """
+    Creates a GIT repository in the given directory with a commit and a tag
+    "vVERSION" for every (version, date) in entries. The commits have the
+    release date as author date. Every third tag is annotated.
+    """
+    subprocess.check_call(["git", "init", "-q", directory])
+    stream = []
+    for mark, (version, version_date) in enumerate(reversed(entries), 1):
+        timestamp = int((datetime.strptime(version_date, "%Y-%m-%d") + timedelta(hours=12)
+                         - datetime(1970, 1, 1)).total_seconds())
+        message = "Release %s" % version
+        stream.append("commit refs/heads/master\nmark :%d\n" % mark)
+        stream.append("author Bench <bench@example.com> %d +0000\n" % timestamp)
+        stream.append("committer Bench <bench@example.com> %d +0000\n" % timestamp)
+        stream.append("data %d\n%s\n\n" % (len(message), message))
+        if mark % 3 == 0:
+            stream.append("tag v%s\nfrom :%d\ntagger Bench <bench@example.com> %d +0000\ndata 0\n\n" %
+                          (version, mark, timestamp))
+        else:
+            stream.append("reset refs/tags/v%s\nfrom :%d\n\n" % (version, mark))
+    prc = subprocess.Popen(["git", "fast-import", "--quiet"], cwd=directory, stdin=subprocess.PIPE)
+    prc.communicate("".join(stream).encode("utf-8"))
+    if prc.returncode != 0:
+        raise RuntimeError("git fast-import failed")
+    subprocess.check_call(["git", "pack-refs", "--all"], cwd=directory)
+
+
+def next_version(version):
+    """ Returns the next minor version of the given version. """
+    major, minor = version.split("-")[0].split(".")[:2]
+    return "%s.%d.0" % (major, int(minor) + 1)
+
+
+def command_args(command, entries):
+    """ Returns the arguments for the given command. """
+    if command == "info":
+        return ["info", entries[len(entries) // 2][0]]
+    if command == "release":
+        return ["release", next_version(entries[0][0])]
+    return [command]
+
+
+def run(script, options, args, runs, changelog):
+    """
+    Runs script with options and args and returns the best wall time in
+    seconds and the exit code. Writing commands get a fresh copy of the
+    changelog for every run.
+    """
+    best = None
+    exit_code = None
+    for _ in range(runs):
+        if args[0] in WRITING_COMMANDS:
+            shutil.copy(changelog, changelog + ".work")
+            target = changelog + ".work"
+        else:
+            target = changelog
+        cmd = [sys.executable, script] + options + ["-f", target] + args
+        start = time.time()
+        with open(os.devnull, "w") as devnull:
+            exit_code = subprocess.call(cmd, stdout=devnull, stderr=devnull)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, exit_code
+
+
+def random_versions(count):
+    """ Returns count random version strings, some with prerelease. """
+    rnd = random.Random(42)
+    prereleases = ["alpha", "alpha.1", "beta", "beta.2", "beta.11", "rc.1", "SNAPSHOT"]
+    versions = []
+    for _ in range(count):
+        version = "%d.%d.%d" % (rnd.randint(0, 20), rnd.randint(0, 50), rnd.randint(1, 100))
+        if rnd.random() < 0.2:
+            version += "-" + rnd.choice(prereleases)
+        versions.append(version)
+    return versions
+
+
+def sort_versions(script, version_strs, runs):
+    """
+    Sorts the versions with the class Version of the script and returns the
+    best time in seconds for creating and sorting the Version objects.
+    """
+    namespace = {"__name__": "bench_script", "__file__": script}
+    with open(script) as src:
+        # old versions call main() unconditionally
+        source = re.sub(r"^sys\.exit\(main\(\)\)$", "", src.read(), flags=re.MULTILINE)
+    # newer versions are a launcher that imports keepAChangelogLib from the
+    # directory of the script
+    sys.modules.pop("keepAChangelogLib", None)
+    exec(compile(source, script, "exec"), namespace) # pylint: disable=exec-used
+    if "Version" in namespace:
+        version_class = namespace["Version"]
+    else:
+        version_class = namespace["keepAChangelogLib"].Version
+        sys.path.remove(os.path.dirname(os.path.realpath(script)))
+    best = None
+    for _ in range(runs):
+        start = time.time()
+        sorted(version_class(vers) for vers in version_strs)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def compare_baseline(results, baseline_file, threshold):
+    """
+    Prints the comparison of the results with the baseline. Returns the
+    number of regressions.
+    """
+    with open(baseline_file) as bfile:
+        baseline = json.load(bfile)
+    if baseline.get("params") != results["params"]:
+        print("WARNING: Baseline was created with different parameters: %s" % baseline.get("params"))
+    base_timings = baseline.get("timings", {})
+    regressions = 0
+    print("\nComparison with baseline %s:" % baseline_file)
+    for script, timings in results["timings"].items():
+        # compare with the same script or the first one of the baseline
+        base = base_timings.get(script) or next(iter(base_timings.values()), {})
+        for command, seconds in timings.items():
+            if seconds is None or base.get(command) is None:
+                continue
+            change = (seconds - base[command]) / base[command] * 100
+            mark = ""
+            if change > threshold:
+                mark = "  REGRESSION"
+                regressions += 1
+            print("%-40s %-10s %8.3f s -> %8.3f s (%+6.1f%%)%s" %
+                  (script, command, base[command], seconds, change, mark))
+    return regressions
+
+
+def main():
+    """ Main function. """
+    # pylint: disable=too-many-branches,too-many-statements,too-many-locals
+    params = {"versions": 20000, "body_lines": 8, "prerelease_ratio": 0.1, "comment_ratio": 0.1,
+              "mix_links": False, "release_ready": False, "git": False, "runs": 3, "sort_versions": 100000}
+    commands = ALL_COMMANDS
+    scripts = []
+    generate_dir = None
+    output_file = None
+    baseline_file = None
+    threshold = 10.0
+    try:
+        opts, argv = getopt.getopt(sys.argv[1:], "n:l:p:c:LRgG:s:C:r:k:o:b:t:h")
+        for opt, value in opts:
+            if opt == "-n":
+                params["versions"] = int(value)
+            elif opt == "-l":
+                params["body_lines"] = int(value)
+            elif opt == "-p":
+                params["prerelease_ratio"] = float(value)
+            elif opt == "-c":
+                params["comment_ratio"] = float(value)
+            elif opt == "-L":
+                params["mix_links"] = True
+            elif opt == "-R":
+                params["release_ready"] = True
+            elif opt == "-g":
+                params["git"] = True
+            elif opt == "-G":
+                generate_dir = value
+            elif opt == "-s":
+                scripts.append(value)
+            elif opt == "-C":
+                commands = value.split(",")
+            elif opt == "-r":
+                params["runs"] = int(value)
+            elif opt == "-k":
+                params["sort_versions"] = int(value)
+            elif opt == "-o":
+                output_file = value
+            elif opt == "-b":
+                baseline_file = value
+            elif opt == "-t":
+                threshold = float(value)
+            elif opt == "-h":
+                print(__doc__)
+                return 0
+    except (getopt.GetoptError, ValueError) as exc:
+        print("ERROR: %s" % exc, file=sys.stderr)
+        return 1
+    if argv:
+        print("ERROR: Unexpected arguments: %s" % " ".join(argv), file=sys.stderr)
+        return 1
+    unknown = [cmd for cmd in commands if cmd not in ALL_COMMANDS]
+    if unknown:
+        print("ERROR: Unknown commands: %s" % ",".join(unknown), file=sys.stderr)
+        return 1
+    if not scripts:
+        scripts.append(os.path.join(script_dir, "..", "keepAChangelog.py"))
+
+    gen_args = (params["versions"], params["body_lines"], params["prerelease_ratio"],
+                params["comment_ratio"], params["mix_links"], params["release_ready"])
+    if generate_dir:
+        if not os.path.isdir(generate_dir):
+            os.makedirs(generate_dir)
+        entries = generate_changelog(generate_dir, *gen_args)
+        if params["git"]:
+            create_git_repo(generate_dir, entries)
+        print("Generated %s" % os.path.join(generate_dir, "CHANGELOG.md"))
+        return 0
+
+    results = {"params": params, "timings": {}, "exit_codes": {}}
+    tmp_dir = tempfile.mkdtemp(prefix="kacl-bench.")
+    try:
+        entries = generate_changelog(tmp_dir, *gen_args)
+        if params["git"]:
+            create_git_repo(tmp_dir, entries)
+        changelog = os.path.join(tmp_dir, "CHANGELOG.md")
+        with open(changelog) as chlg:
+            line_count = sum(1 for _ in chlg)
+        versions_count = len(entries) if params["release_ready"] else len(entries) + 1
+        print("Changelog: %d versions, %d lines, %d bytes%s" % (versions_count, line_count,
+              os.path.getsize(changelog), ", GIT repository" if params["git"] else ""))
+        options = ["-B"] if params["git"] else ["-B", "-n"]
+        for script in scripts:
+            timings = results["timings"].setdefault(script, {})
+            exit_codes = results["exit_codes"].setdefault(script, {})
+            for command in commands:
+                elapsed, exit_code = run(script, options, command_args(command, entries),
+                                         params["runs"], changelog)
+                timings[command] = elapsed
+                exit_codes[command] = exit_code
+                print("%-40s %-10s %7.3f s (exit code %d)" % (script, command, elapsed, exit_code))
+
+        if params["sort_versions"]:
+            version_strs = random_versions(params["sort_versions"])
+            for script in scripts:
+                try:
+                    elapsed = sort_versions(script, version_strs, params["runs"])
+                except Exception as exc: # pylint: disable=broad-except
+                    # e.g. old versions can't compare versions on Python 3
+                    print("%-40s sort %d versions: failed: %s" % (script, params["sort_versions"], exc))
+                    elapsed = None
+                else:
+                    print("%-40s sort %d versions: %7.3f s" % (script, params["sort_versions"], elapsed))
+                results["timings"][script]["sort"] = elapsed
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if output_file:
+        with open(output_file, "w") as ofile:
+            json.dump(results, ofile, indent=2, sort_keys=True)
+            ofile.write("\n")
+    if baseline_file and compare_baseline(results, baseline_file, threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+#!/bin/bash
+#
+# FILE: test-keepAChangelog.sh
+#
+# ABSTRACT: Tests keepAChangelog.py
+#
+# keepAChangelog.py reads the tags and their dates directly from the GIT
+# directory (loose objects, packs, packed-refs). This script creates a
+# throwaway repository with lightweight and annotated tags and checks that
+# "validate" gives the same output and exit code as with "--git-cmd", that
+# calls the git command. This is done before and after "git gc" packed the
+# objects and refs. keepAChangelog.py falls back to the git command if the
+# repository can't be read, so the git command fails when reading directly.
+#
+# A valid changelog must be valid, an invalid one must report the same
+# errors.
+#
+# Further tests: Library use with run_command(), "batch", the version
+# precedence, the version order in the file, "release -P" and writing a
+# symlinked changelog.
+#
+
+script_dir=$(cd "$(dirname "$0")" 2>/dev/null && echo "$PWD")
+script_name=$(basename "$0")
+
+. "$script_dir/_test.include"
+
+kacl="python3 $script_dir/../keepAChangelog.py"
+
+testdir=$(mktemp -d)
+trap 'rm -rf "$testdir"' EXIT
+
+mkdir "$testdir/nogit"
+printf '#!/bin/sh\necho "git must not be called" >&2\nexit 1\n' > "$testdir/nogit/git"
+chmod +x "$testdir/nogit/git"
+
+failed=0
+
+#
+# Creates a commit and optionally a tag with the given date.
+# Parameter: date tag [annotated]
+#
+commit_and_tag()
+{
+    export GIT_AUTHOR_DATE="$1 10:00:00 +0000"
+    export GIT_COMMITTER_DATE="$1 10:00:00 +0000"
+    echo "$1" >> file.txt
+    git add file.txt
+    git commit -q -m "commit $1"
+    if [ -n "$3" ]; then
+        git tag -a -m "Release $2" "$2"
+    elif [ -n "$2" ]; then
+        git tag "$2"
+    fi
+}
+
+#
+# Runs "validate" for the given file with the native reader and the git
+# command and compares the results.
+# Parameter: description file expected_exit_code
+#
+check_validate()
+{
+    echo -n "$1"
+    native=$(PATH="$testdir/nogit:$PATH" $kacl --no-cache -f "$2" validate 2>&1; echo "exit $?")
+    gitcmd=$($kacl --no-cache --git-cmd -f "$2" validate 2>&1; echo "exit $?")
+    if [ "$native" != "$gitcmd" ]; then
+        printERROR
+        echo "native:"; echo "$native"
+        echo "--git-cmd:"; echo "$gitcmd"
+        failed=1
+    elif [ "${gitcmd##*exit }" != "$3" ]; then
+        printERROR
+        echo "Expected exit code $3:"; echo "$gitcmd"
+        failed=1
+    else
+        printOK
+    fi
+}
+
+#
+# Compares the output (with the exit code) of a command with the expected
+# one.
+# Parameter: description expected actual
+#
+check_same()
+{
+    echo -n "$1"
+    if [ "$2" != "$3" ]; then
+        printERROR
+        echo "expected:"; echo "$2"
+        echo "got:"; echo "$3"
+        failed=1
+    else
+        printOK
+    fi
+}
+
+#
+# Runs "validate" for the given file with run_command(), that captures the
+# output, and prints the output and the exit code.
+# Parameter: file Config_fields (Python keyword arguments)
+#
+captured_validate()
+{
+    python3 -c "
+import sys
+sys.path.insert(0, sys.argv[1])
+import keepAChangelog
+exit_code, output = keepAChangelog.run_command(['validate'],
+        keepAChangelog.make_config(changelog=sys.argv[2], $2))
+sys.stdout.write(output)
+sys.exit(exit_code)" "$script_dir/.." "$1" 2>&1
+    echo "exit $?"
+}
+
+cd "$testdir" || exit 1
+git init -q .
+git config user.name "Test"
+git config user.email "test@example.com"
+
+commit_and_tag 2020-01-01 v1.0.0
+commit_and_tag 2020-02-01 v1.1.0 annotated
+commit_and_tag 2020-03-01 v1.2.0
+commit_and_tag 2020-04-01 v2.0.0 annotated
+commit_and_tag 2020-05-01
+
+cat > CHANGELOG.md <<EOF
+# Changelog
+All notable changes to this project will be documented in this file.
+
+## [Unreleased]
+### Added
+- new stuff
+
+## [2.0.0] - 2020-04-01
+### Changed
+- annotated tag
+
+## [1.2.0] - 2020-03-01
+### Fixed
+- lightweight tag
+
+## [1.1.0] - 2020-02-01
+### Fixed
+- annotated tag
+
+## [1.0.0] - 2020-01-01
+### Added
+- lightweight tag
+
+[Unreleased]: https://github.com/x/y/compare/v2.0.0...HEAD
+[2.0.0]: https://github.com/x/y/compare/v1.2.0...v2.0.0
+[1.2.0]: https://github.com/x/y/compare/v1.1.0...v1.2.0
+[1.1.0]: https://github.com/x/y/compare/v1.0.0...v1.1.0
+[1.0.0]: https://github.com/x/y/compare/v0.0.0...v1.0.0
+EOF
+
+# wrong dates of an annotated and a lightweight tag, version without tag
+cat > BAD.md <<EOF
+# Changelog
+
+## [2.1.0] - 2020-05-01
+### Added
+- no tag
+
+## [2.0.0] - 2020-04-02
+### Changed
+- annotated tag
+
+## [1.2.0] - 2020-03-03
+### Fixed
+- lightweight tag
+
+## [1.1.0] - 2020-02-01
+### Fixed
+- annotated tag
+
+[2.1.0]: https://github.com/x/y/compare/v2.0.0...v2.1.0
+[2.0.0]: https://github.com/x/y/compare/v1.2.0...v2.0.0
+[1.2.0]: https://github.com/x/y/compare/v1.1.0...v1.2.0
+[1.1.0]: https://github.com/x/y/compare/v1.0.0...v1.1.0
+EOF
+
+check_validate "Valid changelog, loose objects" CHANGELOG.md 0
+check_validate "Invalid changelog, loose objects" BAD.md 1
+
+git gc -q --prune=now
+if [ -n "$(ls .git/refs/tags)" ] || [ -z "$(ls .git/objects/pack/*.pack 2>/dev/null)" ]; then
+    echo "git gc didn't pack the refs and objects"
+    failed=1
+fi
+
+check_validate "Valid changelog, packed objects and refs" CHANGELOG.md 0
+check_validate "Invalid changelog, packed objects and refs" BAD.md 1
+
+# the git command is also used when the output is captured
+expected=$($kacl --no-cache --git-cmd -f BAD.md validate 2>&1; echo "exit $?")
+check_same "run_command() with the git command" "$expected" \
+    "$(captured_validate BAD.md "git_native=False, cache=False")"
+check_same "run_command() with the git command, no tag index" "$expected" \
+    "$(captured_validate BAD.md "git_native=False, cache=False, tag_index=False")"
+
+# "batch" gives the same results as "validate" with all ways to read the tags
+expected=$(echo "CHANGELOG.md: VALID"
+    $kacl --no-cache -f BAD.md validate 2>&1
+    echo "BAD.md: INVALID"
+    echo "2 changelogs checked, 1 failed"
+    echo "exit 1")
+for opts in "" "--git-cmd" "--no-tag-index"; do
+    for jobs in 1 2; do
+        check_same "batch -j $jobs $opts" "$expected" \
+            "$($kacl --no-cache $opts batch -j $jobs validate CHANGELOG.md BAD.md 2>&1; echo "exit $?")"
+    done
+done
+check_same "batch -j 0" "$(echo "ERROR: batch: Invalid number of jobs: 0"; echo "exit 1")" \
+    "$($kacl batch -j 0 validate CHANGELOG.md 2>&1; echo "exit $?")"
+
+# semver.org precedence, lowest first: prerelease < release, numeric <
+# alphanumeric identifiers, shorter prerelease < longer, "Unreleased" highest
+check_same "Version precedence" "OK" "$(python3 -c "
+import sys
+sys.path.insert(0, sys.argv[1])
+from keepAChangelog import Version
+ordered = ['0.0.1', '0.9.0', '1.0.0-alpha', '1.0.0-alpha.1', '1.0.0-alpha.beta', '1.0.0-beta',
+           '1.0.0-beta.2', '1.0.0-beta.11', '1.0.0-rc.1', '1.0.0', '1.0.1', '1.1.0', '1.10.0', '2.0.0',
+           'Unreleased']
+for i, low in enumerate(ordered):
+    for high in ordered[i + 1:]:
+        if not (Version(low) < Version(high) and Version(high) > Version(low)
+                and Version(low) != Version(high)):
+            print('%s < %s failed' % (low, high))
+if Version('1.0.0+build.1') < Version('1.0.0') or Version('1.0.0') < Version('1.0.0+build.1'):
+    print('build metadata is not ignored')
+print('OK')" "$script_dir/.." 2>&1)"
+
+# the versions must be in descending order
+cat > ORDER.md <<EOF
+# Changelog
+
+## [Unreleased]
+
+## [1.0.0] - 2020-02-01
+### Added
+- higher
+
+## [1.0.0-rc.1] - 2020-03-01
+### Added
+- lower than 1.0.0
+
+## [1.1.0] - 2020-01-01
+### Added
+- higher than the previous version
+
+[Unreleased]: https://github.com/x/y/compare/v1.0.0...HEAD
+[1.0.0]: https://github.com/x/y/compare/v1.0.0-rc.1...v1.0.0
+[1.0.0-rc.1]: https://github.com/x/y/compare/v1.1.0...v1.0.0-rc.1
+[1.1.0]: https://github.com/x/y/compare/v1.0.0...v1.1.0
+EOF
+check_same "Versions not in descending order" \
+    "$(echo "ORDER.md[13] ERROR: Version 1.1.0 is not lower than previous version 1.0.0-rc.1"; echo "exit 1")" \
+    "$($kacl -n -f ORDER.md validate 2>&1; echo "exit $?")"
+
+# "release -P" only replaces the changed lines and keeps all other bytes,
+# e.g. CRLF line endings and trailing spaces. The second changed line is
+# far behind the first 64 KB block.
+{
+    printf '# Changelog\r\n\r\n## [Unreleased]\r\n### Added\r\n- feature  \r\n'
+    for i in $(seq 3000); do
+        printf -- '- line %d with some text to get past the first block\r\n' "$i"
+    done
+    printf '\r\n## [0.9.0] - 2020-01-01\r\n### Added\r\n- first\r\n\r\n'
+    printf '[Unreleased]: https://github.com/x/y/compare/v0.9.0...HEAD\r\n'
+    printf '[0.9.0]: https://github.com/x/y/compare/v0.0.0...v0.9.0\r\n'
+} > PATCH.md
+cp PATCH.md PATCH.orig
+sed -e "s/^## \[Unreleased\]\r\$/## [1.0.0] - $(date +%Y-%m-%d)\r/" \
+    -e 's|^\[Unreleased\]: \(.*\)/v0.9.0...HEAD\r$|[1.0.0]: \1/v0.9.0...v1.0.0\r|' PATCH.md > PATCH.expected
+$kacl -q -n -P -f PATCH.md release 1.0.0 >/dev/null 2>&1
+check_same "release -P keeps the bytes of unchanged lines" "$(od -c PATCH.expected)" "$(od -c PATCH.md)"
+check_same "release -P creates a backup" "$(od -c PATCH.orig)" "$(od -c PATCH.md.kaclBackup)"
+
+# writing a symlinked changelog replaces the target, the backup has the old content
+mkdir real
+cp CHANGELOG.md real/LINKED.md
+printf '\n\n' >> real/LINKED.md
+cp real/LINKED.md LINKED.orig
+ln -s real/LINKED.md LINKED.md
+$kacl -q -n -f LINKED.md rewrite >/dev/null 2>&1
+check_same "rewrite keeps a symlink" "real/LINKED.md" "$(readlink LINKED.md)"
+check_same "rewrite writes the target of a symlink" "$($kacl -n -f LINKED.orig --stdout rewrite 2>&1)" \
+    "$(cat real/LINKED.md)"
+check_same "backup of a symlinked changelog" "regular file: $(cat LINKED.orig)" \
+    "$(stat -c %F LINKED.md.kaclBackup): $(cat LINKED.md.kaclBackup)"
+
+exit $failed
+
+#---------[ END OF FILE test-keepAChangelog.sh ]-------------------------------